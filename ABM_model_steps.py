@@ -9,77 +9,143 @@ version edited by Orla O'Neill
 """
 
 #import packages
+from agent_store import *
 from individual import *
 from community import *
 from decisions import *
 from hh_class import *
 from weather_check import *
 from hh_class_for_mirgants import *
+from recorder import *
+from rng import *
+from output import *
+from population import *
+from network import *
+from checkpoint import *
+from registry import *
+from destinations import *
+from aggregates import *
 import random
 import math
+import itertools
+import hashlib
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
-import networkx as nx
 from cartopy.feature import ShapelyFeature
 from cartopy.io.shapereader import Reader
 
+#household level output, list fields hold one value per member of the household
+HOUSEHOLD_FIELDS = ['tick','month','year','hh_id','type','migrations','arrivals','wealth','num_shocked','wtp','wta','found_work',
+                    'employment type','ag_fac','number_of_hh_members','agent IDs','from','mig_dest','living in','upazila']
+HOUSEHOLD_LIST_FIELDS = ['employment type','agent IDs','from','mig_dest','living in']
+#members that have moved away are recorded as 'Migrated'
+EMPLOYMENT_LABELS = np.array(EMPLOYMENT_TYPES + ('Migrated',))
+MIGRATED = len(EMPLOYMENT_TYPES)
+
+def read_census(testing=False):
+    #census data indexed by upazila code
+    if testing:
+        #testing data set for trial runs
+        df_census=pd.read_excel(r"Bangladesh cencus Data\2011\testing_upazilas.xlsx",skiprows=9)
+        df_census.index=df_census.Code
+        df_census=df_census.drop('Code',axis=1)
+        df_census=df_census.drop('Unnamed: 0',axis=1)
+        df_census=df_census.rename(columns={'Upazila/Thana Name':'Upazila'})
+    else:
+        df_census=pd.read_excel(r"CBangladesh cencus Data\census_2011_with_common_crops.xlsx")
+        df_census.index=df_census.Code
+        df_census=df_census.drop('Code',axis=1)
+    return df_census
+
+def read_upazilas():
+    bgd_shapefile_path = r"shapefiles\gadm41_BGD_3.shp" 
+    return gpd.read_file(bgd_shapefile_path)
+
 #initialize model
 class ABM_Model:
     def __init__(self, decision, mig_util, mig_threshold, wealth_factor, ag_factor, comm_scale, shock_method, network_type, w1, w2, w3, k,
-     threshold,senario,testing=False,factor=100000,binary=False):
+     threshold,senario,testing=False,factor=100000,binary=False,weather_cache='weather_cache',weather_options={},
+     record_path=None,flush_every=12,writer=None,census=None,hazards=None,gdf=None,parallel=None,seed=None,population_cache='population_cache',destination='max',top_k=None,search_radius=None,distance_decay=None,decay_km=50,moves_visible=None,set_up=True):
+        #arguments the model is made with, kept in checkpoints so the model can be made again
+        #(set_up=False leaves the upazilas without agents, for restoring from a checkpoint)
+        self.params = {'decision': decision, 'mig_util': mig_util, 'mig_threshold': mig_threshold, 'wealth_factor': wealth_factor,
+                       'ag_factor': ag_factor, 'comm_scale': comm_scale, 'shock_method': shock_method, 'network_type': network_type,
+                       'w1': w1, 'w2': w2, 'w3': w3, 'k': k, 'threshold': threshold, 'senario': senario, 'testing': testing,
+                       'factor': factor, 'binary': binary, 'weather_cache': weather_cache, 'weather_options': weather_options,
+                       'record_path': record_path, 'flush_every': flush_every, 'parallel': parallel, 'population_cache': population_cache,
+                       'destination': destination, 'top_k': top_k,
+                       'search_radius': search_radius, 'distance_decay': distance_decay, 'decay_km': decay_km,
+                       'moves_visible': moves_visible}
         self.decision = decision #set decision type
+        #parallel=n steps the upazilas in n threads at once, None steps them one after another
+        self.parallel = parallel
+        self.pool = None
+        #moves_visible='immediately' moves the migrants of each upazila as soon as it has stepped, so the upazilas
+        #stepping after it already have them, and 'next_tick' moves all migrants at the end of the tick. upazilas
+        #stepped in parallel can only do 'next_tick', which is the default for them ('immediately' otherwise)
+        if moves_visible is None:
+            moves_visible = 'immediately' if parallel is None else 'next_tick'
+        if moves_visible not in ('immediately', 'next_tick'):
+            raise ValueError("moves_visible should be 'immediately' or 'next_tick'")
+        if moves_visible == 'immediately' and parallel is not None:
+            raise ValueError("upazilas stepped in parallel can only have moves_visible='next_tick'")
+        self.moves_visible = moves_visible
+        self.timings = None #time spent in each phase of step_upazila, only kept when set to a dict
+        self.timing_lock = threading.Lock() #upazilas stepped in parallel add their times one at a time
+        #all random numbers come from streams of this service, so the same seed gives the same run
+        self.rng = rng_service(seed)
+        self.params['seed'] = self.rng.seed
         self.mig_util = mig_util #utility to migrate
         self.mig_threshold = mig_threshold #threshold to migrate
         self.senario=senario
         
-        #check weather for the senario
-        weather=check_weather(self.senario)
+        #check weather for the senario, weather_cache=None recomputes it without caching
+        #weather_options are passed to check_weather, e.g. {'lazy':True} loads the CMIP6 data chunked with dask
+        #hazards=(F,C,H) uses weather that has already been loaded instead
+        if hazards is None:
+            hazards=load_weather(self.senario,binary,cache_dir=weather_cache,**weather_options)
+        self.F,self.C,self.H=hazards
         if binary:
-            self.F,self.C,self.H=weather.binary_checker()
             self.ft='true'
         else:
-            self.F,self.C,self.H=weather.normalised_checker()
             self.ft='false'
 
-        #setting time values
+        #setting time values, with the month and year of every tick worked out once
         self.time=self.F.time
         self.tick=0
+        self.dates=self.time.values
+        self.months=self.dates.astype('datetime64[M]').astype(int) % 12 + 1
+        self.years=self.dates.astype('datetime64[Y]').astype(int) + 1970
         
         self.migrations = pd.DataFrame()#Initialize number of overall migrations
         self.wealth_factor = wealth_factor #scale of initial household wealth
-        self.av_wealth = 0 #this is to store community level average wealth 
-        self.av_land = 0 #this is to store community level average land
+        #community level totals of wealth, land, migrants and shocks are kept per upazila in self.stats
         self.ag_factor = ag_factor #scalar of relationship between land and wealth
         self.comm_scale = comm_scale #scale (% community) impacted by an environmental shock
         self.shock_method = shock_method #this can be "shock" or "slow_onset"
         
         self.network_type = network_type
         self.network_size = 3
-        self.network = nx.Graph() #initialize empty network to be generated 
+        #the network of each upazila is stored as network_{ID}, a CSR adjacency (indptr, indices) over hh ids
         
         #weights for TPB
         self.w1 = w1
         self.w2 = w2
         self.w3 = w3
         self.k = k 
+        self.tpb_weights = np.array([w1, w2, w3]) / (w1 + w2 + w3)
         
         #threshold for PMT
         self.threshold = threshold
         
         self.mig_total_total=0
 
-        #load in census data
-        if testing:
-            #testing data set for trial runs
-            self.df_census=pd.read_excel(r"Bangladesh cencus Data\2011\testing_upazilas.xlsx",skiprows=9)
-            self.df_census.index=self.df_census.Code
-            self.df_census=self.df_census.drop('Code',axis=1)
-            self.df_census=self.df_census.drop('Unnamed: 0',axis=1)
-            self.df_census=self.df_census.rename(columns={'Upazila/Thana Name':'Upazila'})
-        else:
-            self.df_census=pd.read_excel(r"CBangladesh cencus Data\census_2011_with_common_crops.xlsx")
-            self.df_census.index=self.df_census.Code
-            self.df_census=self.df_census.drop('Code',axis=1)
+        #load in census data, unless it is given already read in
+        self.df_census=read_census(testing) if census is None else census
         
         #find the number of agents
         self.df_individual = self.df_census['Total'].apply(lambda x: math.ceil(x / factor))
@@ -87,435 +153,553 @@ class ABM_Model:
         
         #find the number of households
         self.df_hh=(self.df_census['hh_number'].apply(lambda x: math.ceil(x / factor)))[:-1]
-        self.step_time=self.time.isel(time=0)
+        self.step_time=self.time[0]
+
+        #hazards as (tick, upazila) arrays so a shock is just an array lookup
+        upazilas=[int(ID) for ID in self.df_hh.index]
+        self.F_table=hazard_table(self.F,'I_flood',self.time,upazilas)
+        self.C_table=hazard_table(self.C,'wind_speed',self.time,upazilas)
+        self.H_table=hazard_table(self.H,'ts',self.time,upazilas)
+
+        #(tick, upazila) masks of when the dominant crop is in season and when it is reset
+        start_month=self.df_census.loc[self.df_hh.index,'harvest_start'].values
+        end_month=self.df_census.loc[self.df_hh.index,'reset_month'].values
+        month=self.months[:,None]
+        self.in_season=np.where(start_month <= end_month,
+                                (start_month <= month) & (month <= end_month),
+                                (month >= start_month) | (month <= end_month))
+        self.reset_season=month==end_month
         
-        #read in upazila shapefile
-        bgd_shapefile_path = r"shapefiles\gadm41_BGD_3.shp" 
-        self.gdf = gpd.read_file(bgd_shapefile_path)
+        #read in upazila shapefile, unless it is given already read in
+        self.gdf = read_upazilas() if gdf is None else gdf
 
         #for storing data
-        for ID in self.df_hh.index:
-            data_set_key = f'data_set_{ID}'
+        for n,ID in enumerate(self.df_hh.index):
             origin_comm_key=f'origin_comm_{ID}'
             ag_fac_key=f'ag_fac_{ID}'
             jobs_avail_key=f'jobs_avail_{ID}'
 
             self.__dict__[ag_fac_key]=self.ag_factor
             self.__dict__[jobs_avail_key] = math.ceil((self.df_census.loc[ID,'Industry']+self.df_census.loc[ID,'Service'])/factor) #number of non_ag jobs in community
-            self.__dict__[data_set_key] = pd.DataFrame()
             self.__dict__[origin_comm_key] = origin(self.df_hh[ID], self.__dict__[jobs_avail_key], self.comm_scale,
-                                                    self.F.sel(region=int(ID)),self.C.sel(region=int(ID)),self.H.sel(region=int(ID)),
+                                                    self.F_table[:,n],self.C_table[:,n],self.H_table[:,n],
                                                     self.__dict__[ag_fac_key])
             
             
-        self.last = pd.DataFrame()
         self.mig_df=pd.DataFrame()
+
+        #pull of every upazila on migrants, destination='max' sends them to the upazila with the highest pull,
+        #'top_k' to one of the top_k highest at random and 'weighted' to one of them with chances by pull
+        #search_radius (km) only lets them go to upazilas with centroids that close, or closer if their household
+        #had less than mig_threshold before paying for the move, and distance_decay ('exponential' or 'gravity') makes the pull
+        #of an upazila fall off over decay_km
+        self.search_radius = search_radius
+        neighbours = None
+        if search_radius is not None or distance_decay is not None:
+            neighbours = radius_neighbours(*centroids(self.gdf, self.df_hh.index), np.inf if search_radius is None else search_radius)
+        self.pull = pull_table(len(self.df_hh), destination, top_k, neighbours, distance_decay, decay_km)
+        self.upazila_number = {ID: n for n, ID in enumerate(self.df_hh.index)}
+
+        #household level data of every tick, kept in memory or written to parquet in record_path
+        self.recorder = recorder(HOUSEHOLD_FIELDS, HOUSEHOLD_LIST_FIELDS, labels={'employment type': EMPLOYMENT_LABELS},
+                                 path=record_path, flush_every=flush_every)
+        #how save_files saves the data, a parquet dataset in model_output by default
+        self.writer = parquet_writer() if writer is None else writer
+
+        #columnar storage for all agents in all upazilas
+        self.people = individual_store()
+        self.households = household_store()
+        #rows of the agents in each upazila, and where each individual is
+        self.registry = agent_registry(self.people)
+        #running totals of each upazila, averaged over the households it started with
+        self.stats = upazila_stats(self.df_hh.values)
         
-        #set up agents for each upazila
-        for x in self.df_hh.index:
-            self.set_up_agents(x)
+        #set up agents for each upazila, the same population is only made once for a seed and kept in
+        #population_cache (None makes it every time, as does not giving a seed)
+        if set_up:
+            self.set_up_population(population_cache if seed is not None else None)
             
             
 
+    def population_key(self):
+        #key for the agents made by set_up_agents, changes if the census numbers, factor, seed, any argument
+        #used in making the agents or the code making them changes. the decision weights, k and threshold only
+        #go into the household objects, which set_population makes again with the model's own
+        key=hashlib.sha256()
+        key.update(pd.util.hash_pandas_object(pd.DataFrame({'individuals':self.df_individual,'households':self.df_hh})).values.tobytes())
+        for name in ['factor','seed','wealth_factor','ag_factor','network_type']:
+            key.update((','+name+':'+str(self.params[name])).encode())
+        folder=os.path.dirname(os.path.abspath(__file__))
+        for name in ['ABM_model_steps.py','population.py','network.py','individual.py','hh_class.py','agent_store.py','rng.py','registry.py']:
+            key.update(file_digest(os.path.join(folder,name)).encode())
+        return key.hexdigest()[:16]
+
+    def set_up_population(self,cache_dir=None):
+        #make the agents of every upazila, or read them from cache_dir if they have been made before
+        path=None if cache_dir is None else os.path.join(cache_dir,'population_'+self.population_key()+'.npz')
+        if path is not None and os.path.exists(path):
+            self.set_population(read_checkpoint(path))
+            for n,ID in enumerate(self.df_hh.index):
+                self.stats.count(n, self.households, self.registry.hh_set(ID))
+                self.__dict__[f'got_job_{ID}'] = 0
+            return
+        for ID in self.df_hh.index:
+            self.set_up_agents(ID)
+        if path is not None:
+            save_checkpoint(self.get_population(),path)
+
     def set_up_agents(self, ID):
         # Create individuals
-        individual_set_key = f'individual_set_{ID}'
-        ind_key=f'ind_{ID}'
         ag_fac_key=f'ag_fac_{ID}'
-        self.__dict__[individual_set_key] = pd.DataFrame()
-        for i in range(self.df_individual.loc[ID]):
-            ind_key = Individual(self.__dict__[ag_fac_key],ID)
-            row = pd.DataFrame({'ind': [ind_key], 'id': [ind_key.unique_id],
-                                'age': [ind_key.age], 'hh': [ind_key.hh],
-                                'gender': [ind_key.gender],
-                                'originally_from':[ind_key.originally_from],'currently_living':np.nan,
-                                'mig_id':None,'mig_dest':None})
-            self.__dict__[individual_set_key] = pd.concat([self.__dict__[individual_set_key], row])
+        rng = self.rng.stream('setup', ID)
+        #rows of the individuals living in the upazila
+        individual_set = make_individuals(self.people, self.df_individual.loc[ID], ID, self.__dict__[ag_fac_key], rng)
     
         # Create households
-        hh_set_key = f'hh_set_{ID}'
-        a_key =f'a_{ID}'
         got_job_key = f'got_job_{ID}'
-        self.__dict__[hh_set_key] = pd.DataFrame()  # Empty DataFrame to store agents created
-        for i in range(self.df_hh.loc[ID]):
-            self.__dict__[a_key] = Household(self.wealth_factor, self.ag_factor, self.w1, self.w2, self.w3, self.k, self.threshold,self.df_individual.loc[ID]/self.df_hh.loc[ID])
-            self.__dict__[a_key].gather_members(self.__dict__[individual_set_key])
-            self.__dict__[a_key].assign_head(self.__dict__[individual_set_key])
-            row = pd.DataFrame({'household': [self.__dict__[a_key]], 'hh_id': [self.__dict__[a_key].unique_id],
-                                'wtp': [self.__dict__[a_key].wtp], 'wta': [self.__dict__[a_key].wta],'type':['normal']})
-            self.__dict__[hh_set_key] = pd.concat([self.__dict__[hh_set_key], row])
+        #rows of the households in the upazila, in order of hh id
+        hh_set = make_households(self.households, self.people, individual_set, ID, self.df_hh.loc[ID],
+                                 self.df_individual.loc[ID]/self.df_hh.loc[ID], self.wealth_factor, self.ag_factor,
+                                 self.w1, self.w2, self.w3, self.k, self.threshold, rng)
+        self.registry.add_upazila(ID, individual_set, hh_set)
     
         
-        self.average_land(ID)
+        self.stats.count(self.upazila_number[ID], self.households, hh_set)
         self.generate_network(ID)
         
         self.__dict__[got_job_key] = 0 #tracks successful job in labor market
         
-        for i in self.__dict__[hh_set_key]['household']: #set network
-            i.set_network(self.__dict__[hh_set_key], self.network)
-        #setting the hh id to 1 for the next upazila
-        Household.next_uid=1
+        for i in hh_set: #set network
+            self.households.objects[i].set_network(*self.__dict__[f'network_{ID}'])
 
     def model_step(self):
-        self.step_time=self.time.isel(time=self.tick)
+        self.step_time=self.time[self.tick]
 
         #run through each upazila, probably could do this in random order in future
-        for ID in (self.df_hh.index):
-            individual_set_key = f'individual_set_{ID}'
-            hh_set_key = f'hh_set_{ID}'
-            ag_fac_key=f'ag_fac_{ID}'
-            origin_comm_key=f'origin_comm_{ID}'
-            
-            #random schedule each time
-            random_sched_hh = np.random.permutation((self.__dict__[hh_set_key].hh_id))
-            random_sched_ind = np.random.permutation((self.__dict__[individual_set_key].id))
-
-            #change agricultural productivity based on the weather
-            if self.shock_method=='weather': 
-                self.__dict__[origin_comm_key].shock(self.step_time)
-                self.__dict__[ag_fac_key] = self.__dict__[origin_comm_key].ag_factor
-            else: 
-                self.__dict__[ag_fac_key] = self.__dict__[ag_fac_key] * 0.95 #5% decrease in productivitiy each step 
-            
-            self.average_wealth(ID)
-                #households need to check land
-            for i in random_sched_hh: #these are the steps at each tick for hh
-                agent_var = self.__dict__[hh_set_key][self.__dict__[hh_set_key].hh_id == i].household
-                agent_var_0=agent_var[0]
-                
-                agent_var_0.check_land(self.__dict__[origin_comm_key], self.comm_scale)
+        if self.parallel is None:
+            sending=[]
+            for n,ID in enumerate(self.df_hh.index):
+                sending.append((ID,self.step_upazila(n,ID)))
+                if self.moves_visible == 'immediately':
+                    self.apply_migrations(sending)
+                    sending=[]
+        else:
+            #upazilas step at the same time
+            if self.pool is None:
+                self.pool=ThreadPoolExecutor(max_workers=self.parallel)
+            sending=list(zip(self.df_hh.index,self.pool.map(self.step_upazila,range(len(self.df_hh)),self.df_hh.index)))
+        #the migrants still to move all move at the end of the tick, in upazila order
+        self.apply_migrations(sending)
+
+    def step_upazila(self,n,ID):
+        #everything that happens within upazila ID (number n) in a tick, only touching its own agents
+        #returns the rows of the households sending a migrant, in the order they were scheduled
+        ag_fac_key=f'ag_fac_{ID}'
+        origin_comm_key=f'origin_comm_{ID}'
+        lap = self.lap_timer()
+        
+        #random schedule each time
+        schedule = self.rng.stream('schedule', ID)
+        random_sched_hh = schedule.permutation(self.registry.hh_set(ID))
+        random_sched_ind = schedule.permutation(self.registry.individuals(ID))
+        lap('schedule')
+
+        #change agricultural productivity based on the weather
+        if self.shock_method=='weather': 
+            self.__dict__[origin_comm_key].shock(self.tick)
+            self.__dict__[ag_fac_key] = self.__dict__[origin_comm_key].ag_factor
+        else: 
+            self.__dict__[ag_fac_key] = self.__dict__[ag_fac_key] * 0.95 #5% decrease in productivitiy each step 
+        
+        av_wealth=self.stats.mean_wealth(n)
+        lap('shock')
+
+        #find if the dominant crop is in season and if so, hire employees
+        #tf= True or False
+        tf=bool(self.in_season[self.tick,n])
+
+            #households need to check land, then hire
+        shocked, lost = check_land_and_hire(self.households, random_sched_hh, self.__dict__[origin_comm_key], self.comm_scale, tf,
+                                            self.ag_factor, self.rng.stream('land', ID))
+        self.stats.shocked[n] += shocked
+        self.stats.wealth[n] += lost
+        lap('check_land')
+
+            #individuals look for work
+        find_work_batch(self.people, self.households, random_sched_ind)
+        lap('find_work')
+
+        #double auction at model level 
+        self.double_auction(ID)
+        self.pull.set_jobs(n, np.sum(self.households.num_employees[self.registry.hh_set(ID)]))
+        lap('double_auction')
                 
-                #find if the dominant crop is in season and if so, hire employees
-                step_time=self.time.isel(time=self.tick).values
-                month = step_time.astype('datetime64[M]').astype('int').item() % 12 + 1
-                start_month=self.df_census.loc[ID,'harvest_start']
-                end_month=self.df_census.loc[ID,'reset_month']
-                #tf= True or False
-                if start_month <= end_month:
-                    tf=start_month <= month <= end_month
-                else:
-                    tf=month >= start_month or month <= end_month
-                agent_var_0.hire_employees(tf) 
-    
-                #individuals look for work
-            for j in random_sched_ind: #steps for individuals
-
-                ind_var = self.__dict__[individual_set_key][self.__dict__[individual_set_key].id == j].ind
-                if ind_var[0] is not None:
-                    ind_var[0].check_eligibility()
-                    ind_var[0].find_work(self.__dict__[hh_set_key], self.mig_util)
-                else:
-                    pass
+        if self.tick==0:
+            return random_sched_hh[:0]
+
+        #households check their network and utility, then all decide at once whether to send a migrant
+        #(so a neighbour sending someone this tick is only seen through the network next tick)
+        hh_set = self.registry.hh_set(ID)
+        indptr, indices = self.__dict__[f'network_{ID}']
+        in_network = hh_set[:len(indptr)-1] #migrant households come after the ones in the network
+        self.households.network_moves[in_network] = neighbour_sum(indptr, indices, self.households.mig_binary[in_network])
+        self.households.network_moves[hh_set[len(indptr)-1:]] = 0
+        sum_utility_batch(self.households, self.people, hh_set, self.registry.individuals(ID))
+
+        deciding = hh_set[self.households.type[hh_set] != 'migrant']
+        outcome, migrants = decide_migration(self.decision, self.households, self.people, deciding, self.registry.individuals(ID),
+                                             self.mig_util, self.mig_threshold, self.__dict__[origin_comm_key], av_wealth, self.stats.mean_land(n),
+                                             self.ag_factor, self.tpb_weights, self.k, self.threshold, self.rng.stream('decision', ID))
+        send_migrants(self.decision, self.households, self.people, deciding, outcome, migrants, self.mig_util, self.mig_threshold)
+        self.stats.sent[n] += np.sum(outcome)
+        self.stats.wealth[n] -= np.sum(outcome) * self.mig_threshold
+        lap('migrate')
+
+        #update wealth
+        update_wealth_batch(self.households, self.people, hh_set, self.registry.individuals(ID), self.ag_factor)
+        #every household has changed, so the total is summed again (which also stops it drifting)
+        self.stats.wealth[n] = np.sum(self.households.wealth[self.registry.hh_set(ID)])
+        lap('update_wealth')
+
+        return random_sched_hh[self.households.mig_agent_id[random_sched_hh] >= 0]
+
+    def lap_timer(self):
+        #function adding the time since it was last called to self.timings[phase], does nothing unless
+        #self.timings is a dict (as benchmark.py sets it). in parallel the times of all threads are added up
+        if self.timings is None:
+            return lambda phase: None
+        last = [time.perf_counter()]
+        def lap(phase):
+            now = time.perf_counter()
+            with self.timing_lock:
+                self.timings[phase] = self.timings.get(phase, 0) + now - last[0]
+            last[0] = now
+        return lap
+
+    def apply_migrations(self,sending):
+        #sending holds (ID, rows of the households of upazila ID sending a migrant), a destination is chosen for
+        #each of the migrants in turn and then they all move at once. a migrant with nowhere to go stays
+        moving=[]
+        destinations=[]
+        for ID,hh_rows in sending:
+            for i in hh_rows:
+                mig_agent_id=self.households.mig_agent_id[i]
+                destination=self.pull_calculation(ID,mig_agent_id)
+                if destination is not None:
+                    moving.append(mig_agent_id)
+                    destinations.append(destination)
+        if moving:
+            self.move_agents(np.array(moving,dtype=np.int64),np.array(destinations,dtype=np.int64))
     
-            #double auction at model level 
-            self.double_auction(ID)
-                    
-            if self.tick>0:
-                    #households decide to send a migrant or not and update wealth
-                for i in random_sched_hh: #these are the steps at each tick for hh
-                    hh_var = self.__dict__[hh_set_key][self.__dict__[hh_set_key].hh_id == i].household
-                    if hh_var[0] is not None:
-                        hh_var[0].check_network(self.__dict__[hh_set_key])
-                        hh_var[0].sum_utility(self.__dict__[individual_set_key])
-                        outcome=hh_var[0].migrate(self.decision, self.__dict__[individual_set_key],self.__dict__[hh_set_key], self.mig_util, self.mig_threshold, self.__dict__[origin_comm_key], self.av_wealth, self.av_land)
-                        
-                        hh_var[0].update_wealth(self.__dict__[individual_set_key])
-                        
-                        if outcome:
-                            #if it is decided that a migrant will be sent, choose a destination and move them
-                            mig_agent_id=hh_var[0].mig_angent_id
-                            best_location=self.pull_calculation(ID,mig_agent_id) 
-                            self.move_agent(ID,mig_agent_id,best_location)
+    def run(self,ticks,checkpoint_every=None,checkpoint_dir='checkpoints'):
+        #step the model until it reaches tick number ticks
+        #checkpoint_every=n saves a checkpoint to checkpoint_dir every n ticks, e.g. checkpoints/tick_0120.npz
+        try:
+            while self.tick < ticks:
+                self.model_step()
+                self.data_collect()
+                self.tick_up()
+                if checkpoint_every and self.tick % checkpoint_every == 0:
+                    self.checkpoint(os.path.join(checkpoint_dir, 'tick_%04d.npz' % self.tick))
+        finally:
+            self.close()
+
+    def close(self):
+        #stop the threads stepping upazilas in parallel, model_step starts them again if it is called again
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def checkpoint(self,path):
+        #save the state of the model at the start of this tick
+        save_checkpoint(self.get_state(),path)
+
+    @classmethod
+    def restore(cls,path,**changes):
+        #make the model saved in checkpoint path again, ready to carry on from the tick it was saved at
+        #changes replace arguments of the model, e.g. senario=585 to branch off a different senario, and
+        #census, hazards, gdf or writer can be given as when making a model. a new seed starts new random streams
+        state = read_checkpoint(path)
+        model = cls(**{**state['params'], **changes}, set_up=False)
+        model.set_state(state, keep_rng='seed' not in changes)
+        return model
+
+    def get_state(self):
+        #everything about the model that changes as it runs, as numbers and numpy arrays
+        IDs = list(self.df_hh.index)
+        value = lambda key: np.array([self.__dict__.get(f'{key}_{ID}', np.nan) for ID in IDs], dtype=np.float64)
+        comms = [self.__dict__[f'origin_comm_{ID}'] for ID in IDs]
+        state = {'params': self.params, 'tick': self.tick,
+                 'mig_total': getattr(self, 'mig_total', 0), 'mig_sum': getattr(self, 'mig_sum', 0), 'mig_total_total': self.mig_total_total,
+                 'mig_df': {name: self.mig_df[name].values for name in self.mig_df.columns},
+                 'rng': self.rng.get_state(), 'recorder': self.recorder.get_state(), 'pull': self.pull.get_state(),
+                 **self.get_population(),
+                 'ag_fac': value('ag_fac'), 'got_job': value('got_job'), 'stats': self.stats.get_state(),
+                 'community': {name: np.array([getattr(comm, name) for comm in comms])
+                               for name in ['impacted', 'avail_jobs', 'num_impacted', 'ag_factor', 'weather']}}
+        return state
+
+    def set_state(self,state,keep_rng=True):
+        #put the model back in state, made by get_state of a model with the same upazilas
+        self.set_population(state)
+        self.tick = state['tick']
+        self.step_time = self.time[max(self.tick-1, 0)]
+        self.mig_total = state['mig_total']
+        self.mig_sum = state['mig_sum']
+        self.mig_total_total = state['mig_total_total']
+        mig_df = state['mig_df']
+        self.mig_df = pd.DataFrame(mig_df, index=np.zeros(len(mig_df['tick']), dtype=np.int64)) if mig_df else pd.DataFrame()
+        if keep_rng:
+            self.rng.set_state(state['rng'])
+        self.recorder.set_state(state['recorder'])
+        self.pull.set_state(state['pull'])
+        self.stats.set_state(state['stats'])
+        for n,ID in enumerate(self.df_hh.index):
+            self.__dict__[f'ag_fac_{ID}'] = state['ag_fac'][n]
+            self.__dict__[f'got_job_{ID}'] = int(state['got_job'][n])
+            comm = self.__dict__[f'origin_comm_{ID}']
+            for name, values in state['community'].items():
+                setattr(comm, name, values[n].item())
+
+    def get_population(self):
+        #the agents, their households and networks, and which upazila they are in
+        IDs = list(self.df_hh.index)
+        hh = self.households
+        return {'people': self.people.get_state(), 'households': hh.get_state(),
+                'network': {'indptr': pack_rows([self.__dict__[f'network_{ID}'][0] for ID in IDs]),
+                            'indices': pack_rows([[] if self.__dict__[f'network_{ID}'][1] is None else self.__dict__[f'network_{ID}'][1] for ID in IDs]),
+                            'complete': np.array([self.__dict__[f'network_{ID}'][1] is None for ID in IDs])},
+                'upazilas': np.array(IDs, dtype=np.int64),
+                'individual_set': pack_rows([self.registry.individuals(ID) for ID in IDs]),
+                'hh_set': pack_rows([self.registry.hh_set(ID) for ID in IDs])}
+
+    def set_population(self,state):
+        if list(state['upazilas']) != [int(ID) for ID in self.df_hh.index]:
+            raise ValueError('the saved agents are of a model with different upazilas')
+
+        #agents, with the objects viewing their rows made again
+        self.people.set_state(state['people'])
+        for row in range(len(self.people)):
+            Individual.view(self.people, row)
+        self.households.set_state(state['households'])
+        for row in range(len(self.households)):
+            agent_class = Migrant if self.households.type[row] == 'migrant' else Household
+            agent_class.view(self.households, row, self.wealth_factor, self.ag_factor, self.w1, self.w2, self.w3, self.k, self.threshold)
+
+        individual_sets = unpack_rows(*state['individual_set'])
+        hh_sets = unpack_rows(*state['hh_set'])
+        indptrs = unpack_rows(*state['network']['indptr'])
+        indices = unpack_rows(*state['network']['indices'])
+        self.registry = agent_registry(self.people)
+        for n,ID in enumerate(self.df_hh.index):
+            self.registry.add_upazila(ID, individual_sets[n], hh_sets[n])
+            self.__dict__[f'network_{ID}'] = (indptrs[n], None if state['network']['complete'][n] else indices[n].astype(index_dtype(len(indptrs[n]))))
+            for i in hh_sets[n][:len(indptrs[n])-1]:
+                self.households.objects[i].set_network(*self.__dict__[f'network_{ID}'])
 
-
-    
     def pull_calculation(self,agent_ID,mig_agent_id): 
-        pull=[] 
-        individual_set_key = f'individual_set_{agent_ID}'
-
-        #set up for return migration, but ran out of time to actually make it work
-        if self.__dict__[individual_set_key].loc[self.__dict__[individual_set_key].id == mig_agent_id].ind.values[0].migrated==True:
-            print('!!!')
-            if self.__dict__[individual_set_key].loc[self.__dict__[individual_set_key].id == mig_agent_id,'originally_from'].values[0]==self.__dict__[individual_set_key].loc[self.__dict__[individual_set_key].id == mig_agent_id,'currently_living'].values[0]:
-                print('migrant going back')
-                return self.__dict__[individual_set_key].loc[self.__dict__[individual_set_key].id == mig_agent_id,'mig_dest'].values[0]
-                
+        people = self.people
+
+        #someone who has migrated before goes home, or back to where they migrated to if they are home
+        if people.migrated[mig_agent_id]==True:
+            (living_in, _, _), (home, _) = self.registry.locate(people.id[mig_agent_id])
+            if living_in==home:
+                return int(people.mig_dest[mig_agent_id])
             else:
-                print('migrant going home')
-                return self.__dict__[individual_set_key].loc[self.__dict__[individual_set_key].id == mig_agent_id,'originally_from'].values[0]
+                return home
                 
         else:
-            for ID in self.df_hh.index: #want to change to within radius of affordability 
-                data_set_key = f'data_set_{ID}' 
-                hh_set_key = f'hh_set_{ID}'  
-                if ID==agent_ID: 
-                    #make sure the agent doesn't choose original upazila
-                    pull.append(-999) 
-                else:
-                    #find number of agri jobs avalible
-                    no_jobs=0
-                    for k in self.__dict__[hh_set_key].household.values:
-                        no_jobs+=k.num_employees
-                    #find average of these payments
-                    money_to_be_made=self.__dict__[data_set_key].wtp.values[-len(self.__dict__[hh_set_key]):]
-                    #calculate pull
-                    pull.append(np.mean(money_to_be_made)*no_jobs) 
-
-            #find destination with the highest pull
-            max_pull=max(pull) 
-            max_pull_loc=pull.index(max_pull) 
-            max_pull_ID=self.df_hh.index[max_pull_loc]
-        
-            return max_pull_ID
+            #destination by the pull of the other upazilas this tick, within the radius the household could afford
+            #before it paid mig_threshold for the move
+            reach = None
+            if self.search_radius is not None:
+                wealth = self.households.mig_wealth[people.hh[mig_agent_id]]
+                reach = self.search_radius * (min(max(wealth / self.mig_threshold, 0), 1) if self.mig_threshold > 0 else 1)
+            best = self.pull.choose(self.upazila_number[agent_ID], self.rng.stream('destination', agent_ID), reach)
+            return None if best is None else self.df_hh.index[best]
     
     def move_agent(self,agentid,j,ID):
-        #create a new hh in that upazila
-        #add the migrant to that hh
-        hh_set_key = f'hh_set_{ID}'
-        hh_old_set_key=f'hh_set_{agentid}'
-        a_key =f'a_{agentid}'
-        b_key=f'b_{ID}'
-        individual_set_key = f'individual_set_{agentid}'
-        individual_mig_set_key=f'individual_set_{ID}'
-        data_set_key=f'data_set_{ID}'
-
-        for i in self.__dict__[hh_set_key].household:
-            i.mig_arr+=1
-
-        #set up for return migration, but ran out of time to actually make it work
-        if self.__dict__[individual_set_key].loc[self.__dict__[individual_set_key].id == j].ind[0].migrated==True:
-            old_hh_id=self.__dict__[individual_set_key].loc[self.__dict__[individual_set_key].id==j,'ind'][0].hh
-            self.__dict__[individual_mig_set_key].loc[self.__dict__[individual_mig_set_key].id==j,'ind']=self.__dict__[individual_set_key].loc[self.__dict__[individual_set_key].id==j,'ind']
-
-            mask = self.__dict__[data_set_key]['agent IDs'].apply(lambda x: np.isin(j, x))
-            hh_no=self.__dict__[data_set_key][mask].hh_id[0].values[0]
-            self.__dict__[individual_mig_set_key].loc[self.__dict__[individual_mig_set_key].id==j,'hh']=hh_no
-            self.__dict__[individual_mig_set_key].loc[self.__dict__[individual_mig_set_key].id==j,'ind'][0].hh=hh_no
-            self.__dict__[individual_set_key].loc[self.__dict__[individual_set_key].id==j,'hh']=hh_no
-            self.__dict__[individual_set_key].loc[self.__dict__[individual_set_key].id==j,'ind'][0].hh=hh_no
-
-            self.__dict__[individual_set_key].loc[self.__dict__[individual_set_key].id == j,'currently_living']= int(ID)
-            
-            self.__dict__[individual_set_key].loc[self.__dict__[individual_set_key].id==j,'ind']=None
-            
-            
-        else:
-            ##what is in the origional hh creation
-            self.__dict__[b_key] = Migrant(self.wealth_factor, self.ag_factor, self.w1, self.w2, self.w3, self.k, self.threshold)
-            self.__dict__[b_key].hh_network=self.__dict__[a_key].hh_network
-            self.__dict__[b_key].unique_id=(max(self.__dict__[hh_set_key].hh_id.values)+1)
-            
-            ##creation of a new hh for migrant
-            self.__dict__[b_key].gather_members(self.__dict__[individual_set_key].loc[self.__dict__[individual_set_key].id == j])
-            self.__dict__[b_key].assign_head(self.__dict__[individual_set_key].loc[self.__dict__[individual_set_key].id == j])
-            row = pd.DataFrame({'household': [self.__dict__[b_key]], 'hh_id': [self.__dict__[b_key].unique_id],
-                                'wtp': 0, 'wta': [self.__dict__[b_key].wta],'type':['migrant']})
-            self.__dict__[hh_set_key] = pd.concat([self.__dict__[hh_set_key], row])
-            
-            #changing features of agent in origional upazila
-            self.__dict__[individual_set_key].loc[self.__dict__[individual_set_key].id == j,'currently_living']= int(ID)
-            self.__dict__[individual_set_key].loc[self.__dict__[individual_set_key].id == j,'mig_id']=self.__dict__[b_key].unique_id
-            
-            #adding migrant to new upazila
-            self.__dict__[individual_mig_set_key]=pd.concat([self.__dict__[individual_mig_set_key],self.__dict__[individual_set_key].loc[self.__dict__[individual_set_key].id == j]])
-            
-            #changing hh in new upazila
-            self.__dict__[individual_mig_set_key].loc[self.__dict__[individual_mig_set_key].id == j,'hh'] = self.__dict__[b_key].unique_id
-            self.__dict__[individual_mig_set_key].loc[self.__dict__[individual_mig_set_key].id==j,'ind'][0].hh=self.__dict__[b_key].unique_id
-            
-            self.__dict__[individual_mig_set_key].loc[self.__dict__[individual_mig_set_key].id == j,'mig_dest']=int(ID)
-            self.__dict__[individual_set_key].loc[self.__dict__[individual_set_key].id == j,'mig_dest']=int(ID)
-
-            #removing the agent from origional upazila
-            self.__dict__[individual_set_key].loc[self.__dict__[individual_set_key].id == j].ind.migrated=True
-            self.__dict__[individual_mig_set_key].loc[self.__dict__[individual_mig_set_key].id == j].ind.migrated=True
-            self.__dict__[individual_set_key].loc[self.__dict__[individual_set_key].id==j,'ind']=None
-            self.__dict__[individual_mig_set_key].loc[self.__dict__[individual_mig_set_key].id == j,'employment']='None'
-            
+        #move the individual in row j to upazila ID
+        self.move_agents(np.array([j]),np.array([ID]))
+
+    def move_agents(self,moving,destinations):
+        #move the individuals in rows moving to upazilas destinations. someone migrating for the first time gets
+        #a new migrant household, made for all of a destination's migrants at once with hh ids following on
+        #from its last household
+        people = self.people
+        households = self.households
+        hh_no = np.empty(len(moving),dtype=np.int64)
+
+        #return migration, to the household they were born into or the one they made when they first migrated
+        returning = people.migrated[moving]
+        for m in np.flatnonzero(returning):
+            j,ID = moving[m],destinations[m]
+            if ID==people.originally_from[j]:
+                hh_no[m]=people.origin_hh[j]
+            else:
+                hh_no[m]=self.registry.household(ID, people.mig_id[j])
+
+        order = np.argsort(destinations,kind='stable')
+        for here in np.split(order,np.flatnonzero(np.diff(destinations[order]))+1):
+            ID = destinations[here[0]]
+            n = self.upazila_number[ID]
+            arrivals = self.stats.arrived(n,len(here))
+            new = ~returning[here]
+            if new.any():
+                ##creation of new hhs for the migrants
+                rows = make_migrants(households, people, moving[here[new]], ID, len(self.registry.hh_set(ID))+1, self.wealth_factor, self.ag_factor,
+                                     self.w1, self.w2, self.w3, self.k, self.threshold, self.rng.stream('migration', ID))
+                households.arrivals_before[rows] = arrivals[new]
+                self.registry.add_households(ID, rows)
+                self.stats.add_households(n, households, rows)
+                hh_no[here[new]] = rows
+
+        #changing features of agents
+        new = moving[~returning]
+        people.mig_id[new]=households.hh_id[hh_no[~returning]]
+        people.mig_dest[new]=destinations[~returning]
+        people.migrated[new]=True
+        people.employment[new]=EMPLOYMENT_CODE['None']
+
+        #moving the agents from origional upazila to the new one
+        self.registry.move(moving, destinations, hh_no)
 
     def double_auction(self,ID): #gets people looking for work and hh employing
-        individual_set_key = f'individual_set_{ID}'
-        hh_set_key = f'hh_set_{ID}'
         got_job_key = f'got_job_{ID}'
         origin_comm_key=f'origin_comm_{ID}'
-        poss_employees = []  
-        poss_employers = [] 
-        still_looking_skilled = []
-        still_looking_unskilled = []
+        people = self.people
+        households = self.households
+        rng = self.rng.stream('auction', ID)
+        looking = EMPLOYMENT_CODE['Looking']
         auctions = 3 # rounds w/ nothing changing 
         static_rounds = 0 
 
-        for i in self.__dict__[individual_set_key]['ind']:
-            if i is not None:
-                if i.employment == "Looking":
-                    poss_employees.append(i)
-            # else:
-            #     pass
-        if poss_employees == None:
-            return
-        for h in self.__dict__[hh_set_key]['household']:
-            if h.num_employees > 0:
-                poss_employers.append(h)
-        if poss_employers == None:
-            return 
+        ind_rows = self.registry.individuals(ID)
+        poss_employees = ind_rows[people.employment[ind_rows] == looking]
+        hh_rows = self.registry.hh_set(ID)
+        poss_employers = hh_rows[households.num_employees[hh_rows] > 0]
 
         all_looking = len(poss_employees)
         
         while static_rounds < auctions and all_looking > 0: 
-            changed = False 
-            for a in poss_employers: #households pick some people
-                if a.num_employees > 0: 
-                    if a.num_employees > len(poss_employees):
-                        random_inds_look =  np.random.choice(poss_employees, len(poss_employees))
-                    else:
-                        random_inds_look =  np.random.choice(poss_employees, a.num_employees)
-                    
-                    for random_ind in random_inds_look:
-                        if random_ind.employment != "Looking":
-                            pass 
-                        elif a.wtp >= random_ind.wta:
-                            a.employees.append(a)
-                            a.num_employees = a.num_employees - 1
-                            random_ind.salary = (random_ind.wta + a.wtp)/2
-                            random_ind.employment = "OtherAg"
-                            changed = True 
-                            random_ind.employer = a.unique_id
-                            a.payments.append(random_ind.salary)
-                            all_looking = all_looking - 1 
-                            self.__dict__[got_job_key] += 1 
-                            self.__dict__[individual_set_key].loc[(self.__dict__[individual_set_key].id == random_ind.unique_id), 'ind'] = random_ind
-                self.__dict__[hh_set_key].loc[(self.__dict__[hh_set_key].hh_id == a.unique_id), 'household'] = a
-                
-            if changed:
+            #households pick some people, each one still hiring draws (with replacement) as many of
+            #the people looking as it has positions left
+            employers = poss_employers[households.num_employees[poss_employers] > 0]
+            draws = np.minimum(households.num_employees[employers], len(poss_employees))
+            proposer = np.repeat(employers, draws)
+            candidate = poss_employees[rng.integers(0, len(poss_employees), draws.sum())]
+
+            #going through the draws in order, a person is hired by the first household they are
+            #still looking at that pays at least what they are willing to accept
+            ok = (people.employment[candidate] == looking) & (households.wtp[proposer] >= people.wta[candidate])
+            proposer, candidate = proposer[ok], candidate[ok]
+            candidate, first = np.unique(candidate, return_index=True)
+            proposer = proposer[first]
+            hires = len(candidate)
+
+            if hires > 0:
+                people.salary[candidate] = (people.wta[candidate] + households.wtp[proposer])/2
+                people.employment[candidate] = EMPLOYMENT_CODE["OtherAg"]
+                people.employer[candidate] = proposer
+                np.add.at(households.employees, proposer, 1)
+                np.add.at(households.num_employees, proposer, -1)
+                np.add.at(households.payments, proposer, people.salary[candidate])
+                all_looking = all_looking - hires 
+                self.__dict__[got_job_key] += hires 
                 static_rounds = 0 
             else:
                 static_rounds += 1 
-                
-                
 
         #individuals may look for an unskilled or a skilled job within the community 
-        for i in self.__dict__[individual_set_key]['ind']:
-            if i is not None:
-                if i.employment == "Looking":
-                    my_hh = self.__dict__[hh_set_key][self.__dict__[hh_set_key]['hh_id'] == i.hh]['household']
-                    if type(my_hh[0])==pd.Series:
-                        my_hh_0=my_hh[0].iloc[0]
-                    else:
-                        my_hh_0=my_hh[0]
-                    if my_hh_0.wealth > self.wealth_factor:
-                        still_looking_skilled.append(i)
-                    else:
-                        still_looking_unskilled.append(i)
-        if still_looking_unskilled == None and still_looking_skilled == None:
-            return 
+        still_looking = ind_rows[people.employment[ind_rows] == looking]
+        skilled = households.wealth[people.hh[still_looking]] > self.wealth_factor
+        still_looking_skilled = still_looking[skilled]
+        still_looking_unskilled = still_looking[~skilled]
         
         if len(still_looking_unskilled) > self.__dict__[origin_comm_key].avail_jobs / 2:
-            found_other_job_unskilled = random.sample(still_looking_unskilled, round(self.__dict__[origin_comm_key].avail_jobs / 2))
+            found_other_job_unskilled = rng.choice(still_looking_unskilled, round(self.__dict__[origin_comm_key].avail_jobs / 2), replace=False)
         else:
             found_other_job_unskilled = still_looking_unskilled
 
         if len(still_looking_skilled) > self.__dict__[origin_comm_key].avail_jobs / 2:
-            found_other_job_skilled = random.sample(still_looking_skilled, round(self.__dict__[origin_comm_key].avail_jobs / 2))
+            found_other_job_skilled = rng.choice(still_looking_skilled, round(self.__dict__[origin_comm_key].avail_jobs / 2), replace=False)
         else:
             found_other_job_skilled = still_looking_skilled
 
-        for i in found_other_job_unskilled:
-            i.employment = "OtherNonAg_Unskilled"
-            i.salary = 24000 * random.random() #some small number
-            self.__dict__[individual_set_key].loc[(self.__dict__[individual_set_key].id == i.unique_id), 'ind'] = i
+        people.employment[found_other_job_unskilled] = EMPLOYMENT_CODE["OtherNonAg_Unskilled"]
+        people.salary[found_other_job_unskilled] = 24000 * rng.random(len(found_other_job_unskilled)) #some small number
 
-        for i in found_other_job_skilled:
-            i.employment = "OtherNonAg_Skilled"
-            i.salary = 50000 * random.random() #some greater number
-            self.__dict__[individual_set_key].loc[(self.__dict__[individual_set_key].id == i.unique_id), 'ind'] = i
+        people.employment[found_other_job_skilled] = EMPLOYMENT_CODE["OtherNonAg_Skilled"]
+        people.salary[found_other_job_skilled] = 50000 * rng.random(len(found_other_job_skilled)) #some greater number
 
-    def generate_network(self,ID): #create community level network with networkx 
-        
+    def generate_network(self,ID): #create community level network, stored as a CSR adjacency
+        rng = self.rng.stream('network', ID)
+        n = self.df_hh.loc[ID]
+        network = empty_csr(n)
         if self.network_type == 'random':
-            self.network = nx.fast_gnp_random_graph(self.df_hh.loc[ID], 0.1) 
+            network = gnp_csr(n, 0.1, rng)
         if self.network_type == 'none':
             pass
         if self.network_type == 'small_world':
-            self.network = nx.watts_strogatz_graph(self.df_hh.loc[ID], self.network_size, 0.15)
+            network = watts_strogatz_csr(n, self.network_size, 0.15, rng)
         if self.network_type == 'preferential':
-            self.network = nx.barabasi_albert_graph(self.df_hh.loc[ID], self.network_size)
+            network = barabasi_albert_csr(n, self.network_size, rng)
         if self.network_type == 'fully_connected':
-            self.network = nx.complete_graph(self.df_hh.loc[ID])
+            #no edges are stored, every household is a neighbour of all the others
+            network = complete_csr(n)
+        self.__dict__[f'network_{ID}'] = network
     
     def average_wealth(self,ID):
-        hh_set_key = f'hh_set_{ID}'
-        self.av_wealth = 0
-        for h in self.__dict__[hh_set_key]['household']:
-            self.av_wealth += h.wealth
-        self.av_wealth = self.av_wealth / self.df_hh.loc[ID]
-        if self.av_wealth == 0: #this is to prevent 0 divisions
-            self.av_wealth = 1
+        return self.stats.mean_wealth(self.upazila_number[ID])
         
     def average_land(self,ID): 
-        hh_set_key = f'hh_set_{ID}'
-        self.av_land = 0
-        for h in self.__dict__[hh_set_key]['household']:
-            self.av_land += h.land_owned
-        self.av_land = self.av_land / self.df_hh.loc[ID]
+        return self.stats.mean_land(self.upazila_number[ID])
         
     def data_collect(self): #use this to collect model level data
     #household level data
         self.mig_total =0
         
-        for ID in self.df_hh.index:
+        for n,ID in enumerate(self.df_hh.index):
             counter=0
-            individual_set_key = f'individual_set_{ID}'
-            hh_set_key = f'hh_set_{ID}'
-            data_set_key = f'data_set_{ID}'
             ag_fac_key=f'ag_fac_{ID}'
             got_job_key = f'got_job_{ID}'
             jobs_avail_key=f'jobs_avail_{ID}'
             
-            step_time=self.time.isel(time=self.tick).values
-            month = step_time.astype('datetime64[M]').astype('int').item() % 12 + 1
-            year=np.datetime64(step_time, 'Y').astype(int)
+            month=self.months[self.tick]
+            year=self.years[self.tick]
             
-            for j in self.__dict__[hh_set_key].hh_id.values:
-                hh_var = self.__dict__[hh_set_key][self.__dict__[hh_set_key].hh_id == j].household
-                hh = hh_var[0]
-                emp=[]
-                dest=[]
-                for i in (self.__dict__[individual_set_key][self.__dict__[individual_set_key].hh==j].ind.values):
-                    
-                    if i is not None:
-                        emp.append(i.employment)
-                        dest.append(i.mig_dest)
-                    else:
-                        emp.append('Migrated')
-                        dest.append('Not sure')
-                row = pd.DataFrame({'tick': [self.tick],'month':[month],'year':[year+1970],'hh_id': [hh.unique_id],'type':[self.__dict__[hh_set_key][self.__dict__[hh_set_key].hh_id == j].type.values][0], 'migrations': [hh.someone_migrated],
-                                    'arrivals':[hh.mig_arr],'wealth': [hh.wealth], 'num_shocked':[hh.num_shocked], 
-                                    'wtp': [hh.wtp], 'wta': [hh.wta],
-                                    'found_work': [self.__dict__[got_job_key]],
-                                    'employment type':[emp],
-                                    'ag_fac': [self.__dict__[ag_fac_key]],
-                                    #'mig_util':[self.mig_util], 'mig_threshold':[self.mig_threshold],
-                                    #'comm_scale':[self.comm_scale],
-                                    #'avalible_jobs':[self.__dict__[jobs_avail_key]],
-                                    #'avalible jobs in origin':[self.origin_comm.avail_jobs],
-                                    #'w1':[self.w1],
-                                    #'w2':[self.w2],
-                                    #'w3':[self.w3],
-                                    #'k':[self.k],
-                                    #'threshold':[self.threshold],
-                                    'number_of_hh_members':[len(self.__dict__[individual_set_key][self.__dict__[individual_set_key].hh==j])],
-                                    'agent IDs':[self.__dict__[individual_set_key][self.__dict__[individual_set_key].hh==j].id.values],
-                                    #'ind_id':[self.__dict__[individual_set_key][self.__dict__[individual_set_key].hh==j].id],
-                                    'from':[self.__dict__[individual_set_key][self.__dict__[individual_set_key].hh==j].originally_from.values],
-                                    'mig_dest':[self.__dict__[individual_set_key][self.__dict__[individual_set_key].hh==j].mig_dest.values],
-                                    'living in':[self.__dict__[individual_set_key][self.__dict__[individual_set_key].hh==j].currently_living.values]})
-                self.__dict__[data_set_key] = pd.concat([self.__dict__[data_set_key], row])
-                
-                
-            self.last = self.__dict__[data_set_key][self.__dict__[data_set_key]['tick'] == self.tick]
-            #self.last_before_that = self.__dict__[data_set_key][self.__dict__[data_set_key]['tick'] == self.tick-1]
+            hh_rows = self.registry.hh_set(ID)
+            hh = self.households
+            hh.mig_arr[hh_rows] = self.stats.arrivals[n] - hh.arrivals_before[hh_rows]
+            people = self.people
+            #members of all the households one after the other, with the number in each household
+            member_lists = [hh.members[j] for j in hh_rows]
+            lengths = np.fromiter(map(len, member_lists), dtype=np.int64, count=len(hh_rows))
+            member_rows = np.fromiter(itertools.chain.from_iterable(member_lists), dtype=np.int64, count=lengths.sum())
+            moved_away = people.hh[member_rows] != np.repeat(hh_rows, lengths)
+            emp = np.where(moved_away, MIGRATED, people.employment[member_rows])
+            self.recorder.record({'tick': self.tick,'month':month,'year':year,'hh_id': hh.hh_id[hh_rows],'type':hh.type[hh_rows], 'migrations': hh.someone_migrated[hh_rows],
+                                  'arrivals':hh.mig_arr[hh_rows],'wealth': hh.wealth[hh_rows], 'num_shocked':hh.num_shocked[hh_rows], 
+                                  'wtp': hh.wtp[hh_rows], 'wta': hh.wta[hh_rows],
+                                  'found_work': self.__dict__[got_job_key],
+                                  'ag_fac': self.__dict__[ag_fac_key],
+                                  'number_of_hh_members':lengths,
+                                  'upazila': int(ID)},
+                                 {'employment type':(lengths, emp),
+                                  'agent IDs':(lengths, people.id[member_rows]),
+                                  'from':(lengths, people.originally_from[member_rows]),
+                                  'mig_dest':(lengths, people.mig_dest[member_rows]),
+                                  'living in':(lengths, people.currently_living[member_rows])})
+            #wtp of this tick, used by migrants to find where to go
+            self.pull.set_wtp(n, hh.wtp[hh_rows])
            
-            self.mig_sum = self.last.loc[:,'migrations'].sum(axis=0)
+            self.mig_sum = self.stats.sent[n]
             #print('no migrants:',self.mig_sum)
             #self.mig_last_time=self.last_before_that.loc[:,'migrations'].sum(axis=0)
             #print(self.mig_last_time)
@@ -526,20 +710,34 @@ class ABM_Model:
             mig_this_tick=self.mig_total-self.mig_df.iloc[-1].loc['total_mirgrants']
         else:
             mig_this_tick=0
-        row=pd.DataFrame({'tick': [self.tick],'date':[self.time.isel(time=self.tick).values],
+        row=pd.DataFrame({'tick': [self.tick],'date':[self.dates[self.tick]],
                           'migrants':[mig_this_tick],'total_mirgrants':[self.mig_total]})
         self.mig_df=pd.concat([self.mig_df,row])
         #self.mig_total_total+=self.mig_total
+        self.stats.record(self.tick)
+        self.recorder.end_tick()
             
 
+    def data_set(self,ID):
+        #household level data of an upazila for every tick so far
+        return self.recorder.to_frame(ID).drop(columns='upazila')
+
+    def upazila_totals(self):
+        #wealth, land, migrants sent, arrivals and shocks of every upazila at the end of every tick so far
+        return self.stats.to_frame(self.df_hh.index)
+
     #tick up model 
     def tick_up(self):
         self.tick += 1
-        step_time=self.time.isel(time=self.tick).values
-        month = step_time.astype('datetime64[M]').astype('int').item() % 12 + 1
+        month=self.months[self.tick]
         #is_january = month == 1
-        for ID in self.df_hh.index:
-            individual_set_key = f'individual_set_{ID}'
+        #reset employment and, if it is jan, everyone ages up
+        self.people.employment = EMPLOYMENT_CODE['None']
+        if month == 1:
+            self.people.age += 1
+            self.people.salary = 0
+
+        for n,ID in enumerate(self.df_hh.index):
             #ag_fac_key=f'ag_fac_{ID}'
             origin_comm_key=f'origin_comm_{ID}'
             jobs_avail_key=f'jobs_avail_{ID}'
@@ -548,53 +746,15 @@ class ABM_Model:
             self.__dict__[origin_comm_key].impacted = False
             #print('before:',self.__dict__[origin_comm_key].avail_jobs)
             self.__dict__[origin_comm_key].avail_jobs = self.__dict__[jobs_avail_key]
-            if not ('origin:',self.__dict__[origin_comm_key].avail_jobs=='dictionary:',self.__dict__[jobs_avail_key]):
-                print('Not matching')
-            
-            for j in self.__dict__[individual_set_key].id:
-                ind_var = self.__dict__[individual_set_key][self.__dict__[individual_set_key].id == j].ind
-                ind_var.employment='None'
-
-                #if it is jan, everyone ages up
-                if month == 1:
-                    if ind_var[0] is not None:
-                        if type(ind_var[0])==pd.Series:
-                            for i in ind_var[0]:
-                                if i is not None:
-                                    i.age_up()
-                        else:
-                            ind_var[0].age_up()
-                
+
             #if the dominant crop is no longer in season, reset the agricultural productivity
-            if month==self.df_census.loc[ID,'reset_month']:
+            if self.reset_season[self.tick,n]:
                 self.__dict__[origin_comm_key].ag_factor=100
                 
     def save_files(self,i=None):
         #function to save data
         #i is the model run if there is multiple runs
-        x=self.senario
-        y=self.decision
-        z=self.network_type
-        j=self.comm_scale
-
-        # Create an Excel writer object
-        if i==None:
-            excel_writer = pd.ExcelWriter("model_senario_"+str(x)+"_method_"+str(y)+"_network_type_"+str(z)+'_binary_'+(self.ft)+".xlsx", engine='xlsxwriter')
-        else:
-            excel_writer = pd.ExcelWriter(str(i)+"_model_senario_"+str(x)+"_method_"+str(y)+"_network_type_"+str(z)+'_binary_'+(self.ft)+".xlsx", engine='xlsxwriter')
-        for ID in self.df_hh.index:
-            data_set_key = f'data_set_{ID}'
-            # Write each DataFrame to a different sheet named by ID
-            self.__dict__[data_set_key].to_excel(excel_writer, sheet_name=str(ID))
-            #print(self.__dict__[data_set_key]['avalible_jobs'])
-            
-
-        # Save the Excel file
-        excel_writer.close()
-        if i==None:
-            self.mig_df.to_excel('number_migrants_senario_'+str(x)+"_method_"+str(y)+"_network_type_"+str(z)+'_binary_'+(self.ft)+".xlsx")
-        else:
-            self.mig_df.to_excel(str(i)+'_number_migrants_senario_'+str(x)+"_method_"+str(y)+"_network_type_"+str(z)+'_binary_'+(self.ft)+".xlsx")
+        self.writer.write(self,i)
         
 
     def plotting(self):
@@ -602,9 +762,9 @@ class ABM_Model:
         migrations=[]
         arrivals=[] 
         for ID in self.df_census.index[:-1]:
-            data_key=f'data_set_{ID}'
-            migrations.append(self.__dict__[data_key].iloc[-1].loc['migrations'])
-            arrivals.append(self.__dict__[data_key].iloc[-1].loc['arrivals'])
+            data_set=self.data_set(ID)
+            migrations.append(data_set.iloc[-1].loc['migrations'])
+            arrivals.append(data_set.iloc[-1].loc['arrivals'])
 
         bgd_shapefile_path = r"\shapefiles\gadm41_BGD_3.shp" 
         gdf = gpd.read_file(bgd_shapefile_path)
@@ -631,8 +791,7 @@ class ABM_Model:
         for index, row in gdf.iterrows():
             region_id = int(row['CC_3'])
             if region_id in self.df_census.index[:-1]:# and 600000>region_id>=550000:
-                data_key=f'data_set_{region_id}'
-                color = cmap(norm(self.__dict__[data_key].iloc[-1].loc['migrations']))
+                color = cmap(norm(self.data_set(region_id).iloc[-1].loc['migrations']))
                 ax.add_geometries([row['geometry']], ccrs.PlateCarree(), facecolor=color, edgecolor='black')
 
                 min_lon = min(min_lon, row['geometry'].bounds[0])
@@ -656,8 +815,7 @@ class ABM_Model:
         for index, row in gdf.iterrows():
             region_id = int(row['CC_3'])
             if region_id in self.df_census.index[:-1]:# and 600000>region_id>=550000:
-                data_key=f'data_set_{region_id}'
-                color = cmap(norm(self.__dict__[data_key].iloc[-1].loc['arrivals']))
+                color = cmap(norm(self.data_set(region_id).iloc[-1].loc['arrivals']))
                 ax.add_geometries([row['geometry']], ccrs.PlateCarree(), facecolor=color, edgecolor='black')
 
                 min_lon = min(min_lon, row['geometry'].bounds[0])
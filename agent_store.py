@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Columnar storage of agent attributes for ABM
+ of environmental migration
+
+Every attribute of every agent lives in one numpy array per column,
+ indexed by an integer row. Individual, Household and Migrant objects
+ are thin views onto a row of these arrays.
+"""
+
+#import packages
+import itertools
+import numpy as np
+
+#employment types are stored as small integer codes
+EMPLOYMENT_TYPES = ('None', 'SelfAg', 'Looking', 'OtherAg', 'OtherNonAg_Unskilled', 'OtherNonAg_Skilled')
+EMPLOYMENT_CODE = {name: code for code, name in enumerate(EMPLOYMENT_TYPES)}
+
+#column name: (dtype, value for new rows)
+INDIVIDUAL_COLUMNS = {
+    'id': (np.int64, 0),
+    'age': (np.float64, 0.0),
+    'gender': ('<U1', ''),
+    'hh': (np.int64, -1), #row of the household the individual lives in, -1 if none
+    'origin_hh': (np.int64, -1), #row of the household the individual was born into
+    'employment': (np.int8, 0),
+    'salary': (np.float64, 0.0),
+    'employer': (np.int64, -1),
+    'can_migrate': (np.bool_, False),
+    'head': (np.bool_, False),
+    'migrated': (np.bool_, False),
+    'ag_factor': (np.float64, 0.0),
+    'alive': (np.bool_, True),
+    'wta': (np.float64, 0.0),
+    'originally_from': (np.int64, 0),
+    'currently_living': (np.int64, 0),
+    'mig_dest': (np.float64, np.nan),
+    'mig_id': (np.float64, np.nan),
+}
+
+HOUSEHOLD_COLUMNS = {
+    'hh_id': (np.int64, 0), #id of the household within its upazila
+    'upazila': (np.int64, 0),
+    'type': ('<U7', 'normal'),
+    'wealth': (np.float64, 0.0),
+    'hh_size': (np.int64, 1),
+    'head': (np.int64, -1),
+    'weights': (np.float64, 0.0),
+    'land_owned': (np.float64, 0.0),
+    'secure': (np.bool_, True),
+    'wellbeing_threshold': (np.float64, 0.0),
+    'network_size': (np.int64, 10),
+    'network_moves': (np.float64, 0.0),
+    'someone_migrated': (np.int64, 0),
+    'mig_arr': (np.int64, 0),
+    'arrivals_before': (np.int64, 0), #migrants that had arrived in the upazila when the household was made
+    'mig_binary': (np.int64, 0),
+    'land_impacted': (np.bool_, False),
+    'wta': (np.float64, 0.0),
+    'wtp': (np.float64, 0.0),
+    'num_employees': (np.int64, 0),
+    'employees': (np.int64, 0),
+    'payments': (np.float64, 0.0), #running sum of all wages paid out
+    'expenses': (np.float64, 0.0),
+    'total_utility': (np.float64, 0.0),
+    'total_util_w_migrant': (np.float64, 0.0),
+    'num_shocked': (np.int64, 0),
+    'land_prod': (np.float64, 0.0),
+    'control': (np.float64, 0.0),
+    'attitude': (np.float64, 0.0),
+    'network_fact': (np.float64, 0.0),
+    'coping_appraisal': (np.float64, 0.0),
+    'adaptive_capacity': (np.float64, 0.0),
+    'mobility_potential': (np.float64, 0.0),
+    'rootedness': (np.float64, 0.0),
+    'unique_mig_threshold': (np.float64, 0.0),
+    'mig_cost': (np.float64, 0.0),
+    'mig_agent_id': (np.int64, -1), #row of the individual chosen to migrate this tick
+    'mig_wealth': (np.float64, 0.0), #wealth of the household when it decided to send a migrant, before paying for it
+}
+
+class agent_store :
+    def __init__(self, columns, capacity=1024):
+        self.columns = columns
+        self.n = 0
+        self.capacity = max(int(capacity), 1)
+        self.data = {name: np.full(self.capacity, default, dtype=dtype) for name, (dtype, default) in columns.items()}
+        self.objects = [] #agent object viewing each row
+
+    def __len__(self):
+        return self.n
+
+    def __getattr__(self, name):
+        #columns are returned as views on the filled part of the array
+        data = self.__dict__.get('data')
+        if data is not None and name in data:
+            return data[name][:self.__dict__['n']]
+        raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        if 'data' in self.__dict__ and name in self.__dict__['data']:
+            self.data[name][:self.n] = value
+        else:
+            super().__setattr__(name, value)
+
+    def add(self, k=1):
+        #reserve k new rows, doubling the arrays when full so appending stays cheap
+        if self.n + k > self.capacity:
+            new_capacity = max(self.capacity * 2, self.n + k)
+            for name, (dtype, default) in self.columns.items():
+                grown = np.full(new_capacity, default, dtype=dtype)
+                grown[:self.n] = self.data[name][:self.n]
+                self.data[name] = grown
+            self.capacity = new_capacity
+        rows = np.arange(self.n, self.n + k)
+        self.n += k
+        return rows
+
+    def get_state(self):
+        #filled part of every column, e.g. to save a run part way through
+        return {'n': self.n, 'columns': {name: self.data[name][:self.n] for name in self.columns}}
+
+    def set_state(self, state):
+        #the agent objects viewing the rows are not part of the state and have to be made again
+        n = int(state['n'])
+        self.capacity = max(n, 1)
+        self.data = {name: np.full(self.capacity, default, dtype=dtype) for name, (dtype, default) in self.columns.items()}
+        for name, values in state['columns'].items():
+            self.data[name][:n] = values
+        self.n = n
+        self.objects = []
+
+class individual_store(agent_store):
+    def __init__(self, capacity=1024):
+        super().__init__(INDIVIDUAL_COLUMNS, capacity)
+
+class household_store(agent_store):
+    def __init__(self, capacity=1024):
+        super().__init__(HOUSEHOLD_COLUMNS, capacity)
+        self.members = [] #rows of every individual that has belonged to each household
+
+    def add(self, k=1):
+        rows = super().add(k)
+        self.members.extend([] for _ in range(k))
+        return rows
+
+    def residents(self, row, people):
+        #members that still live in the household (i.e. have not migrated away)
+        members = np.asarray(self.members[row], dtype=np.int64)
+        return members[people.hh[members] == row]
+
+    def get_state(self):
+        state = super().get_state()
+        state['members'] = pack_rows(self.members)
+        return state
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.members = [rows.tolist() for rows in unpack_rows(*state['members'])]
+
+def pack_rows(lists):
+    #lists of rows as the length of each list and all the rows one after the other
+    lengths = np.fromiter(map(len, lists), dtype=np.int64, count=len(lists))
+    flat = np.fromiter(itertools.chain.from_iterable(lists), dtype=np.int64, count=lengths.sum())
+    return lengths, flat
+
+def unpack_rows(lengths, flat):
+    return np.split(np.asarray(flat, dtype=np.int64), np.cumsum(lengths)[:-1]) if len(lengths) else []
+
+def column(name):
+    #attribute of an agent object that reads and writes its row in the store
+    def fget(self):
+        return self.store.data[name][self.row]
+    def fset(self, value):
+        self.store.data[name][self.row] = value
+    return property(fget, fset)
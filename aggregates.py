@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Running totals of each upazila for ABM
+ of environmental migration
+
+The total wealth and land of the households of each upazila, the
+ migrants they have sent, the migrants that have arrived and the
+ shocks they have had are kept as running totals, added to where the
+ households change (a shock, paying for a migrant, a migrant household
+ being made) rather than summed over all the households again whenever
+ they are needed. The monthly wealth update changes every household,
+ so the wealth total is summed again then.
+
+How many migrants have arrived since a household was made is the
+ arrivals of its upazila less the arrivals when it was made
+ (arrivals_before in the household store), so an arrival only adds one
+ to its upazila.
+
+The totals at the end of every tick are kept by record, which
+ to_frame gives as a table of one row per upazila per tick for the
+ output.
+"""
+
+#import packages
+import numpy as np
+import pandas as pd
+
+#totals kept for each upazila
+TOTALS = ['wealth', 'land', 'sent', 'arrivals', 'shocked']
+
+class upazila_stats :
+    def __init__(self, size):
+        #size is the number of households each upazila started with, which averages are taken over
+        self.size = np.asarray(size, dtype=np.float64)
+        n = len(self.size)
+        self.wealth = np.zeros(n)
+        self.land = np.zeros(n)
+        self.sent = np.zeros(n, dtype=np.int64)
+        self.arrivals = np.zeros(n, dtype=np.int64)
+        self.shocked = np.zeros(n, dtype=np.int64)
+        self.ticks = [] #ticks recorded, and the totals at the end of each
+        self.history = {name: [] for name in TOTALS}
+
+    def count(self, n, households, rows):
+        #totals of upazila number n worked out from its households (rows of the household store), e.g. once they are made
+        self.wealth[n] = np.sum(households.wealth[rows])
+        self.land[n] = np.sum(households.land_owned[rows])
+        self.sent[n] = np.sum(households.someone_migrated[rows])
+        self.shocked[n] = np.sum(households.num_shocked[rows])
+
+    def add_households(self, n, households, rows):
+        self.wealth[n] += np.sum(households.wealth[rows])
+        self.land[n] += np.sum(households.land_owned[rows])
+
+    def arrived(self, n, k=1):
+        #k migrants arrive in upazila number n, returns the arrivals there counting each of them in turn
+        self.arrivals[n] += k
+        return self.arrivals[n] - k + np.arange(1, k + 1)
+
+    def mean_wealth(self, n):
+        av_wealth = self.wealth[n] / self.size[n]
+        if av_wealth == 0: #this is to prevent 0 divisions
+            av_wealth = 1
+        return av_wealth
+
+    def mean_land(self, n):
+        return self.land[n] / self.size[n]
+
+    def record(self, tick):
+        self.ticks.append(tick)
+        for name in TOTALS:
+            self.history[name].append(getattr(self, name).copy())
+
+    def to_frame(self, IDs):
+        #totals of the upazilas IDs (in the order they are numbered) at the end of every recorded tick
+        n = len(IDs)
+        frame = pd.DataFrame({'tick': np.repeat(np.asarray(self.ticks, dtype=np.int64), n),
+                              'upazila': np.tile(np.asarray(IDs, dtype=np.int64), len(self.ticks))})
+        for name in TOTALS:
+            frame[name] = np.concatenate(self.history[name]) if self.ticks else np.zeros(0, dtype=getattr(self, name).dtype)
+        frame['mean_wealth'] = frame['wealth'] / np.tile(self.size, len(self.ticks))
+        return frame
+
+    def get_state(self):
+        state = {name: getattr(self, name).copy() for name in TOTALS}
+        state['history'] = {'tick': np.asarray(self.ticks, dtype=np.int64),
+                            **{name: np.array(self.history[name]).reshape(len(self.ticks), len(self.size)) for name in TOTALS}}
+        return state
+
+    def set_state(self, state):
+        for name in TOTALS:
+            getattr(self, name)[:] = state[name]
+        #checkpoints saved before the totals were recorded have no history
+        history = state.get('history', {'tick': []})
+        self.ticks = [int(tick) for tick in history['tick']]
+        self.history = {name: list(np.asarray(history[name])) if self.ticks else [] for name in TOTALS}
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for ABM
+ of environmental migration
+
+Times the model on made up inputs, so nothing but the code is needed:
+ a census of n_upazilas upazilas with random populations, and random
+ hazards in place of the CMIP6 data. For every decision method and
+ factor it times setting up the agents, each phase of step_upazila
+ (schedule, shock, check_land, find_work, double_auction, migrate,
+ update_wealth), apply_migrations, data_collect, tick_up and
+ save_files, and it times the weather checks on a made up CMIP6 grid.
+ --workers times whole ticks stepped serially and with each number of
+ threads stepping upazilas in parallel, e.g. --workers 2 4, and gives
+ the speedup over serial; it can only show one on a machine with as
+ many cores.
+
+Results are printed per phase as seconds per tick (set_up, save_files
+ and the weather checks as seconds per call), with how each phase
+ scales with the number of agents (the slope of log time against log
+ agents, 1 being linear). --save writes them to a JSON file and
+ --compare checks them against one, e.g.
+    python benchmark.py --compare benchmark_baseline.json
+ benchmark_baseline.json holds the results of the default settings;
+ rerun it with --save when a change makes the model faster or slower
+ on purpose, so the difference shows up in review.
+"""
+
+#import packages
+import argparse
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import xarray as xr
+from ABM_model_steps import *
+
+DECISIONS = ['utility', 'utility_return_time', 'push_threshold', 'tpb', 'pmt', 'mobility_potential', 'hybrid']
+FACTORS = [4000, 2000, 1000]
+#arguments of the model that are not benchmarked
+MODEL_ARGS = {'mig_util': 400, 'mig_threshold': 1000, 'wealth_factor': 3000, 'ag_factor': 100, 'comm_scale': 0.4,
+              'shock_method': 'weather', 'w1': 0.15, 'w2': 0.15, 'w3': 0.7, 'k': 10, 'threshold': 20, 'senario': 119}
+#a phase is reported as slower when it takes this many times as long as in the baseline,
+#phases quicker than MIN_SECONDS are too noisy to compare
+TOLERANCE = 1.5
+MIN_SECONDS = 1e-3
+
+def fake_census(n_upazilas=20, population=300000, seed=0):
+    #census in the form read_census gives, with a total row at the end as the real census has
+    rng = np.random.default_rng(seed)
+    total = rng.integers(population // 2, population * 3 // 2, n_upazilas)
+    census = pd.DataFrame({'Upazila': ['upazila ' + str(i) for i in range(n_upazilas)],
+                           'Total': total,
+                           'hh_number': (total / rng.uniform(4, 5, n_upazilas)).astype(int),
+                           'Industry': (total * rng.uniform(0.02, 0.08, n_upazilas)).astype(int),
+                           'Service': (total * rng.uniform(0.05, 0.15, n_upazilas)).astype(int),
+                           'harvest_start': rng.integers(1, 13, n_upazilas),
+                           'reset_month': rng.integers(1, 13, n_upazilas)},
+                          index=pd.Index(100000 + 10 * np.arange(n_upazilas), name='Code'))
+    totals = census.sum(numeric_only=True).to_frame().T
+    totals.index = pd.Index([999999], name='Code')
+    return pd.concat([census, totals])
+
+def fake_hazards(codes, ticks, seed=0):
+    #normalised flood, cyclone and heatwave indices per upazila, as load_weather gives
+    rng = np.random.default_rng(seed)
+    time_ = pd.date_range('2011-01-16', periods=ticks + 1, freq='MS')
+    hazard = lambda name: xr.Dataset({name: (('region', 'time'), rng.uniform(-0.05, 1, (len(codes), len(time_))))},
+                                     coords={'region': list(codes), 'time': time_})
+    return hazard('I_flood'), hazard('wind_speed'), hazard('ts')
+
+def fake_weather(n_upazilas=20, n_lat=40, n_lon=40, years=10, seed=0):
+    #check_weather with made up CMIP6 data on an n_lat x n_lon grid over Bangladesh and square upazilas
+    import geopandas as gpd
+    import shapely
+    rng = np.random.default_rng(seed)
+    lat = np.linspace(20.5, 26.5, n_lat)
+    lon = np.linspace(88, 92.7, n_lon)
+    time_ = pd.date_range('2011-01-16', periods=12 * years, freq='MS')
+    grid = lambda name, mean, spread: xr.Dataset({name: (('time', 'lat', 'lon'), mean + spread * rng.standard_normal((len(time_), n_lat, n_lon)))},
+                                                 coords={'time': time_, 'lat': lat, 'lon': lon})
+    weather = check_weather.__new__(check_weather)
+    weather.cache_dir = None
+    weather.lazy = False
+    weather.cropped = False
+    weather.senario = '119'
+    weather.pr = grid('pr', 5e-5, 2e-5)
+    weather.ts = grid('ts', 300, 3)
+    weather.hist_data_ts = grid('ts', 299, 3)
+    wind = grid('wind_speed', 6, 2)
+    weather.wind = wind.assign(wind_speed=wind.wind_speed.expand_dims(plev=[85000]).transpose('time', 'plev', 'lat', 'lon'))
+    weather.ocean_temp = xr.Dataset({'ts': (('time', 'lat', 'lon'), 303 + rng.standard_normal((len(time_), 6, 6)))},
+                                    coords={'time': time_, 'lat': np.linspace(10, 15, 6), 'lon': np.linspace(80, 93.5, 6)})
+    weather.lat = weather.pr.lat
+    weather.lon = weather.pr.lon
+    corner_lon = rng.uniform(88, 92.4, n_upazilas)
+    corner_lat = rng.uniform(20.5, 26.2, n_upazilas)
+    weather.gdf = gpd.GeoDataFrame({'CC_3': 100000 + 10 * np.arange(n_upazilas)},
+                                   geometry=shapely.box(corner_lon, corner_lat, corner_lon + 0.3, corner_lat + 0.3))
+    weather.centroids = weather.gdf.geometry.centroid
+    weather.grid_index = {}
+    #in place of the distances to the rivers shapefile
+    river_dist = rng.uniform(0.5, 1, n_upazilas)
+    weather.river_distances = lambda: river_dist
+    return weather
+
+def timed(timings, name, function):
+    #function that also adds the time it takes to timings[name]
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timings[name] = timings.get(name, 0) + time.perf_counter() - start
+    return wrapper
+
+def bench_model(decision, factor, ticks=12, network_type='random', census=None, seed=0):
+    #seconds per tick of each phase of one model run, and seconds for set_up and save_files
+    census = fake_census() if census is None else census
+    codes = census.index[:-1]
+    out = tempfile.mkdtemp(prefix='abm_benchmark_')
+    try:
+        model = ABM_Model(decision=decision, network_type=network_type, testing=False, factor=factor, census=census,
+                          hazards=fake_hazards(codes, ticks, seed), gdf='not used', writer=parquet_writer(out), seed=seed,
+                          population_cache=None, set_up=False, **MODEL_ARGS)
+        timings = {}
+        model.timings = timings
+        for name in ['set_up_population', 'apply_migrations', 'data_collect', 'tick_up', 'save_files']:
+            setattr(model, name, timed(timings, name, getattr(model, name)))
+        model.set_up_population()
+        model.run(ticks)
+        model.save_files()
+    finally:
+        shutil.rmtree(out, ignore_errors=True)
+    result = {phase: seconds / ticks for phase, seconds in timings.items()}
+    result['set_up'] = result.pop('set_up_population') * ticks
+    result['save_files'] *= ticks
+    result['agents'] = len(model.people)
+    result['households'] = len(model.households)
+    return result
+
+def bench_parallel(decision, factor, workers, ticks=12, network_type='random', census=None, seed=0, repeat=3):
+    #seconds per tick of running the model serially (workers None) and with upazilas stepped by workers threads.
+    #both move migrants at the end of the tick, as the parallel model has to
+    census = fake_census() if census is None else census
+    codes = census.index[:-1]
+    hazards = fake_hazards(codes, ticks, seed)
+    seconds = []
+    for _ in range(repeat):
+        model = ABM_Model(decision=decision, network_type=network_type, testing=False, factor=factor, census=census,
+                          hazards=hazards, gdf='not used', seed=seed, population_cache=None, parallel=workers,
+                          moves_visible='next_tick', **MODEL_ARGS)
+        start = time.perf_counter()
+        model.run(ticks)
+        seconds.append((time.perf_counter() - start) / ticks)
+    return min(seconds)
+
+def bench_weather(n_upazilas=20, sizes=(20, 40, 80), years=10, repeat=3, seed=0):
+    #seconds for the normalised and binary weather checks on grids of size x size cells, the quickest of repeat
+    results = []
+    for size in sizes:
+        for name in ['normalised_checker', 'binary_checker']:
+            seconds = []
+            for _ in range(repeat):
+                weather = fake_weather(n_upazilas, size, size, years, seed)
+                start = time.perf_counter()
+                getattr(weather, name)()
+                seconds.append(time.perf_counter() - start)
+            results.append({'check': name, 'cells': size * size, 'seconds': min(seconds)})
+    return results
+
+def scaling(table, phases):
+    #slope of log time against log agents of each phase, for each decision method
+    slopes = {}
+    for decision, runs in table.groupby('decision'):
+        if len(runs) < 2:
+            continue
+        x = np.log(runs['agents'].values)
+        slopes[decision] = {phase: float(np.polyfit(x, np.log(np.maximum(runs[phase].values, 1e-9)), 1)[0]) for phase in phases}
+    return pd.DataFrame(slopes).T
+
+def run_benchmarks(decisions=DECISIONS, factors=FACTORS, ticks=12, network_type='random', n_upazilas=20, population=300000,
+                   weather_sizes=(20, 40, 80), repeat=3, seed=0, workers=()):
+    #every model is run repeat times, keeping the quickest time of each phase
+    census = fake_census(n_upazilas, population, seed)
+    runs = []
+    for decision in decisions:
+        for factor in factors:
+            repeats = [bench_model(decision, factor, ticks, network_type, census, seed) for _ in range(repeat)]
+            result = {name: min(r[name] for r in repeats) for name in repeats[0]}
+            runs.append({'decision': decision, 'factor': factor, **result})
+            print(decision, 'factor', factor, result['agents'], 'agents', round(sum(result[p] for p in PHASES if p in result), 4), 's per tick')
+    parallel = []
+    if len(workers):
+        for decision in decisions:
+            for factor in factors:
+                serial = bench_parallel(decision, factor, None, ticks, network_type, census, seed, repeat)
+                for n in workers:
+                    seconds = bench_parallel(decision, factor, n, ticks, network_type, census, seed, repeat)
+                    parallel.append({'decision': decision, 'factor': factor, 'workers': n, 'serial': serial, 'parallel': seconds,
+                                     'speedup': serial / seconds})
+    return {'settings': {'decisions': list(decisions), 'factors': list(factors), 'ticks': ticks, 'network_type': network_type,
+                         'n_upazilas': n_upazilas, 'population': population, 'weather_sizes': list(weather_sizes), 'repeat': repeat,
+                         'seed': seed},
+            'machine': {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+                        'processor': platform.processor(), 'cpus': os.cpu_count()},
+            'model': runs,
+            'parallel': parallel,
+            'weather': bench_weather(n_upazilas, weather_sizes, repeat=repeat, seed=seed)}
+
+#phases timed every tick, in the order they happen
+PHASES = ['schedule', 'shock', 'check_land', 'find_work', 'double_auction', 'migrate', 'update_wealth', 'apply_migrations',
+          'data_collect', 'tick_up']
+
+def report(results):
+    table = pd.DataFrame(results['model'])
+    phases = [p for p in PHASES + ['set_up', 'save_files'] if p in table]
+    with pd.option_context('display.width', 200, 'display.max_columns', None, 'display.float_format', '{:.4f}'.format):
+        print('\nseconds per tick (set_up and save_files per call)')
+        print(table.set_index(['decision', 'factor', 'agents'])[phases])
+        slopes = scaling(table, phases)
+        if len(slopes):
+            print('\nscaling with the number of agents (1 is linear)')
+            print(slopes.round(2))
+        print('\nweather checks (seconds per call)')
+        print(pd.DataFrame(results['weather']).pivot(index='cells', columns='check', values='seconds'))
+        if results.get('parallel'):
+            print('\nseconds per tick, serial and stepping upazilas in parallel on', results['machine'].get('cpus'), 'cpus')
+            print(pd.DataFrame(results['parallel']).set_index(['decision', 'factor', 'workers']))
+
+def compare(results, baseline, tolerance=TOLERANCE, min_seconds=MIN_SECONDS):
+    #phases that take more than tolerance times as long as in baseline, as (run, phase, ratio)
+    slower = []
+    old = {(run['decision'], run['factor']): run for run in baseline['model']}
+    for run in results['model']:
+        key = (run['decision'], run['factor'])
+        if key not in old:
+            continue
+        for phase in PHASES + ['set_up', 'save_files']:
+            if phase in run and old[key].get(phase, 0) > min_seconds:
+                ratio = run[phase] / old[key][phase]
+                if ratio > tolerance:
+                    slower.append((key, phase, ratio))
+    old = {(check['check'], check['cells']): check['seconds'] for check in baseline['weather']}
+    for check in results['weather']:
+        key = (check['check'], check['cells'])
+        if old.get(key, 0) > min_seconds and check['seconds'] / old[key] > tolerance:
+            slower.append((key, 'weather', check['seconds'] / old[key]))
+    return slower
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the phases of the migration ABM on made up inputs.')
+    parser.add_argument('--decision', nargs='+', default=DECISIONS, help='decision methods to time')
+    parser.add_argument('--factor', nargs='+', type=int, default=FACTORS, help='numbers of people per agent to time')
+    parser.add_argument('--ticks', type=int, default=12, help='number of months to run each model for')
+    parser.add_argument('--network_type', default='random')
+    parser.add_argument('--n_upazilas', type=int, default=20)
+    parser.add_argument('--population', type=int, default=300000, help='average population of an upazila')
+    parser.add_argument('--weather_sizes', nargs='+', type=int, default=[20, 40, 80], help='sizes of the made up CMIP6 grids')
+    parser.add_argument('--repeat', type=int, default=3, help='number of times to time everything, keeping the quickest')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', nargs='+', type=int, default=[], help='numbers of threads to time stepping upazilas in parallel with')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to compare the results to')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='ratio to the baseline counted as slower')
+    args = parser.parse_args(argv)
+
+    settings = {'decisions': args.decision, 'factors': args.factor, 'ticks': args.ticks, 'network_type': args.network_type,
+                'n_upazilas': args.n_upazilas, 'population': args.population, 'weather_sizes': args.weather_sizes,
+                'repeat': args.repeat, 'seed': args.seed}
+    results = run_benchmarks(**settings, workers=args.workers)
+    report(results)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline['settings'] != results['settings']:
+            print('\nthe baseline was run with different settings:', baseline['settings'])
+        slower = compare(results, baseline, args.tolerance)
+        print('\n' + str(len(slower)) + ' phases slower than the baseline')
+        for key, phase, ratio in slower:
+            print(key, phase, round(ratio, 2), 'times as long')
+        return 1 if slower else 0
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
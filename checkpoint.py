@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Checkpoints for ABM
+ of environmental migration
+
+A checkpoint is one .npz file holding the state of a model part way
+ through a run: every numpy array of the state is stored as it is, and
+ everything else (the tick, the arguments of the model, the random
+ number streams, ...) as JSON. Nothing is pickled, so a checkpoint can
+ be read without running any of its contents.
+"""
+
+#import packages
+import json
+import os
+import numpy as np
+
+def _split(value, arrays, key):
+    #value with its numpy arrays moved into arrays, leaving {'__array__': key} in their place
+    if isinstance(value, np.ndarray):
+        arrays[key] = value
+        return {'__array__': key}
+    if isinstance(value, dict):
+        return {str(name): _split(item, arrays, key + '/' + str(name)) for name, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_split(item, arrays, key + '/' + str(i)) for i, item in enumerate(value)]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def _join(value, arrays):
+    #inverse of _split
+    if isinstance(value, dict):
+        if '__array__' in value:
+            return arrays[value['__array__']]
+        return {name: _join(item, arrays) for name, item in value.items()}
+    if isinstance(value, list):
+        return [_join(item, arrays) for item in value]
+    return value
+
+def save_checkpoint(state, path):
+    #the file is written under another name first, so a run stopped while saving leaves the old checkpoint
+    #and processes saving the same checkpoint at once do not write into one file
+    arrays = {}
+    meta = _split(state, arrays, 'state')
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    tmp_path = path + '.tmp' + str(os.getpid())
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, __meta__=np.array(json.dumps(meta)), **arrays)
+    os.replace(tmp_path, path)
+
+def read_checkpoint(path):
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data['__meta__']))
+        arrays = {key: data[key] for key in data.files if key != '__meta__'}
+    return _join(meta, arrays)
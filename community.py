@@ -21,41 +21,41 @@ class community :
         self.avail_jobs = n_jobs
         self.num_impacted = 0
         self.comm_impact = comm_impact
-        self.F=F #floods
-        self.C=C #cyclones
-        self.H=H #heatwaves
+        self.F=F #floods, one value per tick
+        self.C=C #cyclones, one value per tick
+        self.H=H #heatwaves, one value per tick
         self.ag_factor=ag_factor
         
         #environmental shock
-    def shock(self,time):
+    def shock(self,tick):
         self.weather=False
 
         #if there is a heatwave
-        if self.H.sel(time=time).ts.values<0:
-            factor=self.H.sel(time=time).values*4.96 #number from Heinicke et al 2022 
+        if self.H[tick]<0:
+            factor=self.H[tick]*4.96 #number from Heinicke et al 2022 
             self.impacted = True
             self.weather=True
             self.num_impacted += 1
-            self.avail_jobs = self.avail_jobs * (1 - self.comm_impact*self.H.sel(time=time).values)#number of jobs decreases with scale of community impact
+            self.avail_jobs = self.avail_jobs * (1 - self.comm_impact*self.H[tick])#number of jobs decreases with scale of community impact
             self.ag_factor = self.ag_factor * (100-factor)/100 
 
         #if there is a flood
-        if self.F.sel(time=time).I_flood.values<0:
-            factor=self.F.sel(time=time).values*10.83 #number from Hasan et al 2021
+        if self.F[tick]<0:
+            factor=self.F[tick]*10.83 #number from Hasan et al 2021
             self.impacted = True
             self.weather=True
             self.num_impacted += 1
-            self.avail_jobs = self.avail_jobs * (1 - self.comm_impact*self.F.sel(time=time).values)  #number of jobs decreases with scale of community impact
+            self.avail_jobs = self.avail_jobs * (1 - self.comm_impact*self.F[tick])  #number of jobs decreases with scale of community impact
             self.ag_factor = self.ag_factor * (100-factor)/100 
             # print(self.ag_factor)
 
         #if there is a cyclone
-        if self.C.sel(time=time).wind_speed.values<0:
-            factor=self.C.sel(time=time).values*10.83 #number from Hasan et al 2021
+        if self.C[tick]<0:
+            factor=self.C[tick]*10.83 #number from Hasan et al 2021
             self.impacted = True
             self.weather=True
             self.num_impacted += 1
-            self.avail_jobs = self.avail_jobs * (1 - self.comm_impact*self.C.sel(time=time).values)  #number of jobs decreases with scale of community impact
+            self.avail_jobs = self.avail_jobs * (1 - self.comm_impact*self.C[tick])  #number of jobs decreases with scale of community impact
             self.ag_factor = self.ag_factor * (100-factor)/100 
             
 
@@ -64,8 +64,8 @@ class origin(community):
     def __init__(self, n_hh, n_jobs, comm_impact,F,C,H,ag_factor):
         super(origin, self).__init__(n_hh, n_jobs, comm_impact,F,C,H,ag_factor)
         self.weather=False
-    def shock(self,time):
-        super(origin, self).shock(time)
+    def shock(self,tick):
+        super(origin, self).shock(tick)
 
 #destinations
 class dhaka(community):
@@ -12,6 +12,8 @@ import random
 import math
 import numpy as np
 import matplotlib.pyplot as plt
+from agent_store import *
+from rng import *
 
 class decision :
     #method decide returns True or False
@@ -49,12 +51,12 @@ class push_threshold(decision):
 class tpb(decision):
     def __init__(self): #initialize utilities
         super().__init__()
-    def decide(self, household):
-        if random.random() <= household.control:
+    def decide(self, household, rng=default_stream):
+        if rng.random() <= household.control:
             perceived_control = 1
         else:
             perceived_control = 0 
-        if random.random() <= household.attitude * household.network_fact:
+        if rng.random() <= household.attitude * household.network_fact:
             attitude_scaled = 1
         else:
             attitude_scaled = 0 
@@ -64,28 +66,191 @@ class tpb(decision):
 class pmt(decision):
     def __init__(self): #initialize utilities
         super().__init__()
-    def decide(self, household):
-        if random.random() <= household.coping_appraisal:
+    def decide(self, household, rng=default_stream):
+        if rng.random() <= household.coping_appraisal:
             self.outcome = True
 
 class mobility_potential(decision):
     def __init__(self): #initialize utilities
         super().__init__()
-    def decide(self, household):
-        if random.random() <= household.unique_mig_threshold:
+    def decide(self, household, rng=default_stream):
+        if rng.random() <= household.unique_mig_threshold:
             self.outcome = True
 
 class hybrid(decision):
     def __init__(self): #initialize utilities
         super().__init__()
-    def decide(self, household):
-        if random.random() <= household.control:
+    def decide(self, household, rng=default_stream):
+        if rng.random() <= household.control:
             perceived_control = 1
         else:
             perceived_control = 0 
-        if random.random() <= household.attitude * household.network_fact:
+        if rng.random() <= household.attitude * household.network_fact:
             attitude_scaled = 1
         else:
             attitude_scaled = 0 
         if perceived_control == 1 and attitude_scaled == 1:
-            self.outcome = True
\ No newline at end of file
+            self.outcome = True
+
+#batched decisions
+#the methods above decide for one household at a time, the functions below make the same
+#decisions for a whole set of households at once from the columns of the household store
+
+DRAWS = 6 #random numbers drawn for every household, whether they are used or not
+
+def choose_migrants(people, rows, individual_set, u):
+    #one eligible member of each household picked at random, -1 where there is nobody to send
+    #u holds one random number in [0,1) per household
+    order = np.argsort(rows)
+    eligible = individual_set[people.can_migrate[individual_set] & ~people.migrated[individual_set]]
+    eligible_hh = people.hh[eligible]
+    idx = np.minimum(np.searchsorted(rows[order], eligible_hh), len(rows) - 1)
+    found = rows[order][idx] == eligible_hh
+    eligible, pos = eligible[found], order[idx[found]]
+
+    by_hh = np.argsort(pos, kind='stable')
+    eligible = eligible[by_hh]
+    counts = np.bincount(pos, minlength=len(rows))
+    starts = np.cumsum(counts) - counts
+    migrants = np.full(len(rows), -1, dtype=np.int64)
+    has = counts > 0
+    migrants[has] = eligible[starts[has] + (u[has] * counts[has]).astype(np.int64)]
+    return migrants
+
+def count_workers(people, rows, individual_set):
+    #number of members of each household that have some employment
+    order = np.argsort(rows)
+    working = individual_set[people.employment[individual_set] != EMPLOYMENT_CODE['None']]
+    working_hh = people.hh[working]
+    idx = np.minimum(np.searchsorted(rows[order], working_hh), len(rows) - 1)
+    found = rows[order][idx] == working_hh
+    return np.bincount(order[idx[found]], minlength=len(rows))
+
+def asset_rate(wealth, mig_util, k):
+    #y = 1/ (1+ e^(-k*x)) for the share of assets left after migrating, 0 <= x <= 1
+    mig_asset_percent = np.divide(wealth - mig_util, wealth, out=np.zeros(len(wealth)), where=wealth != 0)
+    mig_asset_percent = np.maximum(mig_asset_percent, 0)
+    return 1/(1 + np.exp(-k*mig_asset_percent))
+
+def tpb_factors(households, rows, migrant_salary, migrant_age, mig_util, weights, k, u):
+    #Theory of Planned Behavior: behavioral control, attitude and network effect
+    experience = households.someone_migrated[rows] > 0
+    network_exp = households.network_moves[rows] > 0
+    control = weights[0]*asset_rate(households.wealth[rows], mig_util, k) + weights[1]*experience + weights[2]*network_exp
+    perceived_benefit = (mig_util - migrant_salary) / mig_util
+    age_adj = migrant_age - 14
+    attitude = np.where(u <= perceived_benefit, 0.028, 0.014)*(age_adj**2)*np.exp(-1*age_adj / 8)
+    network_fact = (households.network_moves[rows] / households.network_size[rows]) + 1
+    return control, attitude, network_fact
+
+def threat(households, rows, community, ag_factor, u_comm, u_vul):
+    #threat appraisal from Protection Motivation Theory
+    wealth = households.wealth[rows]
+    comm_perception = community.num_impacted * u_comm
+    severity = community.comm_impact * comm_perception
+    vulnerability = np.divide(households.land_owned[rows] * ag_factor, wealth, out=np.zeros(len(rows)), where=wealth > 0) * u_vul
+    vulnerability[wealth <= 0] = 0.9
+    return severity * vulnerability
+
+def decide_migration(method, households, people, rows, individual_set, mig_util, mig_threshold, community,
+                     av_wealth, av_land, ag_factor, weights, k, threshold, rng=default_stream):
+    #decides for all households in rows (household store rows) whether they send a migrant
+    #returns a boolean mask over rows and the row of the chosen migrant (-1 where nobody is chosen)
+    #the factors behind each decision are written to the household store as they are for one household
+    #every household gets its own row of random numbers, in the order of rows, so its decision does
+    #not depend on the order the households are scheduled in
+    rows = np.asarray(rows, dtype=np.int64)
+    n = len(rows)
+    u = rng.random((n, DRAWS))
+    households.mig_agent_id[rows] = -1
+    households.mig_cost[rows] = mig_threshold
+
+    migrants = choose_migrants(people, rows, individual_set, u[:, 0])
+    has = migrants >= 0
+    outcome = np.zeros(n, dtype=bool)
+    salary = people.salary[np.maximum(migrants, 0)]
+    age = people.age[np.maximum(migrants, 0)]
+    wealth = households.wealth[rows]
+    total_utility = households.total_utility[rows]
+
+    if method in ('utility', 'utility_return_time', 'push_threshold'):
+        act = has & (wealth > mig_threshold)
+        util_w_migrant = total_utility - salary + mig_util
+        households.total_util_w_migrant[rows[act]] = util_w_migrant[act]
+        if method == 'utility':
+            outcome = act & (total_utility < util_w_migrant)
+        elif method == 'utility_return_time':
+            return_time = 1
+            outcome = act & ((util_w_migrant - total_utility)*return_time - mig_threshold >= 0)
+        else:
+            outcome = act & (~households.secure[rows] | (total_utility < util_w_migrant))
+
+    elif method == 'tpb': #Theory of Planned Behavior
+        households.total_util_w_migrant[rows[has]] = (total_utility - salary + mig_util)[has]
+        control, attitude, network_fact = tpb_factors(households, rows, salary, age, mig_util, weights, k, u[:, 1])
+        households.control[rows[has]] = control[has]
+        households.attitude[rows[has]] = attitude[has]
+        households.network_fact[rows[has]] = network_fact[has]
+        outcome = has & (u[:, 2] <= control) & (u[:, 3] <= attitude * network_fact)
+
+    elif method == 'pmt': #Protection Motivation Theory
+        threatened = has & (threat(households, rows, community, ag_factor, u[:, 1], u[:, 2]) >= threshold)
+        response_efficacy = households.network_moves[rows] / households.network_size[rows]
+        self_efficacy = households.someone_migrated[rows] > 0
+        cost_efficacy = asset_rate(wealth, mig_util, k)
+        coping_appraisal = (weights[0] * cost_efficacy) + (weights[1] * self_efficacy) + (weights[2] * response_efficacy)
+        households.coping_appraisal[rows[threatened]] = coping_appraisal[threatened]
+        outcome = threatened & (u[:, 3] <= coping_appraisal)
+
+    elif method in ('mobility_potential', 'hybrid'):
+        land_ac = households.land_owned[rows] / (av_land if method == 'mobility_potential' else 14)
+        wealth_ac = wealth / av_wealth
+        family_ac = count_workers(people, rows, individual_set) / households.hh_size[rows]
+        adaptive_capacity = land_ac + wealth_ac + family_ac
+        mobility = households.rootedness[rows]
+        x = households.num_shocked[rows].astype(np.float64)
+        high_ac, high_mp = adaptive_capacity >= 3, mobility >= 0.5
+        if method == 'mobility_potential':
+            shocked = [300*((1/0.5) * (x**(6-1)) * (np.exp(-(1/0.5) * x))) / (6*5*4*3*2),
+                       5*((1/0.8) * (x**(2-1)) * (np.exp(-(1/0.8) * x))) / (2),
+                       1/(1 + np.exp(-0.75*(x-3))),
+                       1/(1 + np.exp(-2*(x-4)))]
+            not_shocked = [0.75, 0.6, 0.1, 0]
+            mig_threshold_hh = np.where(x == 0, np.select([high_ac & high_mp, ~high_ac & high_mp, high_ac & ~high_mp], not_shocked[:3], not_shocked[3]),
+                                        np.select([high_ac & high_mp, ~high_ac & high_mp, high_ac & ~high_mp], shocked[:3], shocked[3]))
+        else:
+            mig_threshold_hh = np.select([high_ac & high_mp, ~high_ac & high_mp, high_ac & ~high_mp],
+                                         [250*((1/0.5) * (x**(6-1)) * (np.exp(-(1/0.5) * x))) / (6*5*4*3*2),
+                                          5*((1/0.8) * (x**(2-1)) * (np.exp(-(1/0.8) * x))) / (2),
+                                          1/(1 + np.exp(-1*(x-3)))],
+                                         1/(1 + np.exp(-4*(x-3))))
+        households.adaptive_capacity[rows[has]] = adaptive_capacity[has]
+        households.mobility_potential[rows[has]] = mobility[has]
+        households.unique_mig_threshold[rows[has]] = mig_threshold_hh[has]
+
+        if method == 'mobility_potential':
+            outcome = has & (u[:, 1] <= mig_threshold_hh)
+        else:
+            #threat appraisal first informed by PMT, with the threshold from mobility potential,
+            #then the decision itself from TPB
+            threatened = has & (threat(households, rows, community, ag_factor, u[:, 1], u[:, 2]) >= mig_threshold_hh)
+            households.total_util_w_migrant[rows[threatened]] = (total_utility - salary + mig_util)[threatened]
+            control, attitude, network_fact = tpb_factors(households, rows, salary, age, mig_util, weights, k, u[:, 3])
+            households.control[rows[threatened]] = control[threatened]
+            households.attitude[rows[threatened]] = attitude[threatened]
+            households.network_fact[rows[threatened]] = network_fact[threatened]
+            outcome = threatened & (u[:, 4] <= control) & (u[:, 5] <= attitude * network_fact)
+
+    migrants[~outcome] = -1
+    return outcome, migrants
+
+def send_migrants(method, households, people, rows, outcome, migrants, mig_util, mig_threshold):
+    #households that decided to send someone pay for it and the migrant's salary is set
+    sending = np.asarray(rows, dtype=np.int64)[outcome]
+    migrants = migrants[outcome]
+    households.mig_wealth[sending] = households.wealth[sending]
+    households.wealth[sending] -= mig_threshold #subtract out mig_threshold cost
+    households.someone_migrated[sending] += 1
+    households.mig_binary[sending] = 1
+    households.mig_agent_id[sending] = migrants
+    people.salary[migrants] = 0 if method == 'hybrid' else mig_util
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Where migrants go for ABM
+ of environmental migration
+
+The pull of an upazila is the average wtp of its households at the
+ end of the last tick times the number of agricultural jobs still open
+ there. Both are kept in one vector over the upazilas, updated once per
+ upazila as it steps rather than worked out again for every migrant.
+ The upazilas are ranked by pull whenever it has changed, so a migrant
+ picks the best one (other than its own), or draws one of the best k,
+ evenly or weighted by their pull, without going over all of them.
+
+With a search radius, migrants only look at the upazilas whose
+ centroids are within the radius of their own, or a shorter distance
+ if their household cannot afford to go that far. The upazilas near
+ each one are found once, as a CSR table (like the household networks)
+ sorted from the nearest, and their pull can fall off with distance.
+"""
+
+#import packages
+import numpy as np
+import pandas as pd
+
+#ways of choosing a destination from the pull of the upazilas
+DESTINATION_METHODS = ('max', 'top_k', 'weighted')
+#ways the pull of an upazila falls off with its distance from the migrant
+DISTANCE_DECAYS = (None, 'exponential', 'gravity')
+EARTH_RADIUS = 6371.0 #km
+
+def centroids(gdf, IDs):
+    #longitude and latitude of the centroid of each upazila in IDs, found by the CC_3 codes of gdf. centroids
+    #are only right in a projected crs, so a shapefile in degrees is projected to its utm zone and back
+    geometry = gdf.geometry
+    if geometry.crs is not None and geometry.crs.is_geographic:
+        points = geometry.to_crs(geometry.estimate_utm_crs()).centroid.to_crs(geometry.crs)
+    else:
+        points = geometry.centroid
+    codes = gdf['CC_3'].astype(int).values
+    table = pd.DataFrame({'lon': points.x.values, 'lat': points.y.values}, index=codes).groupby(level=0).mean()
+    table = table.reindex([int(ID) for ID in IDs])
+    if table.lon.isnull().any():
+        raise ValueError('upazilas not in the shapefile: '+', '.join(map(str, table.index[table.lon.isnull()])))
+    return table.lon.values, table.lat.values
+
+def great_circle(lon1, lat1, lon2, lat2):
+    #distance in km between points given in radians
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1)))
+
+def radius_neighbours(lon, lat, radius, block=1024):
+    #upazilas within radius km of each other as a CSR table (indptr, indices, distances), the neighbours of
+    #each upazila sorted from the nearest. every upazila has at least its nearest one, however far it is
+    n = len(lon)
+    lon, lat = np.radians(lon), np.radians(lat)
+    source, target, distance = [], [], []
+    for start in range(0, n, block):
+        d = great_circle(lon[start:start + block, None], lat[start:start + block, None], lon[None, :], lat[None, :])
+        rows = np.arange(len(d))
+        #an upazila is not its own neighbour, even with an infinite radius
+        d[rows, start + rows] = np.inf
+        near = (d <= radius) & np.isfinite(d)
+        if n > 1:
+            near[rows, np.argmin(d, axis=1)] = True
+        i, j = np.nonzero(near)
+        source.append(start + i)
+        target.append(j)
+        distance.append(d[i, j])
+    source, target, distance = np.concatenate(source), np.concatenate(target), np.concatenate(distance)
+    order = np.lexsort((target, distance, source))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(source, minlength=n))
+    return indptr, target[order], distance[order]
+
+class pull_table :
+    def __init__(self, n, method='max', k=None, neighbours=None, decay=None, decay_km=50):
+        if method not in DESTINATION_METHODS:
+            raise ValueError('destination method should be one of '+', '.join(DESTINATION_METHODS))
+        if decay not in DISTANCE_DECAYS:
+            raise ValueError('distance decay should be one of '+', '.join(map(str, DISTANCE_DECAYS)))
+        self.method = method
+        self.k = k #number of best upazilas top_k and weighted draw from, None for all
+        self.wtp = np.full(n, np.nan) #average wtp of each upazila last tick
+        self.jobs = np.zeros(n) #open agricultural jobs in each upazila
+        self.ranked = None
+        #(indptr, indices, distances) of the upazilas near each one, None lets migrants go anywhere
+        self.neighbours = neighbours
+        self.decay = decay
+        self.decay_km = decay_km
+
+    def set_wtp(self, n, wtp):
+        self.wtp[n] = np.mean(wtp) if len(wtp) else np.nan
+        self.ranked = None
+
+    def set_jobs(self, n, jobs):
+        if self.jobs[n] != jobs:
+            self.jobs[n] = jobs
+            self.ranked = None
+
+    @property
+    def pull(self):
+        return self.wtp * self.jobs
+
+    def rank(self):
+        #upazilas from the highest pull to the lowest (ties in upazila order, no pull at all last), and the
+        #running sum of their pull
+        if self.ranked is None:
+            pull = self.pull
+            order = np.argsort(-pull, kind='stable')
+            weights = np.nan_to_num(pull[order])
+            self.ranked = (order, np.cumsum(weights), np.argsort(order))
+        return self.ranked
+
+    def choose(self, origin, rng=None, reach=None):
+        #number of the upazila a migrant from upazila number origin goes to, only looking reach km away
+        #(as far as the neighbours go if None) when there is a table of neighbours. None if there is no other upazila
+        if self.neighbours is not None:
+            return self.choose_near(origin, rng, reach)
+        order, total, place = self.rank()
+        if len(order) < 2:
+            return None
+        k = len(order) - 1 if self.k is None else min(self.k, len(order) - 1)
+        if self.method == 'max' or k <= 1:
+            return order[1] if order[0] == origin else order[0]
+        #the best k upazilas other than the origin are the first k, or k + 1 if the origin is among them
+        own = place[origin]
+        last = k if own >= k else k + 1
+        if self.method == 'top_k':
+            pick = rng.integers(0, k)
+            return order[pick + (pick >= own)]
+        #weighted by pull, leaving out the pull of the origin
+        own_pull = total[own] - (total[own - 1] if own else 0)
+        size = total[last - 1] - (own_pull if own < last else 0)
+        if size <= 0:
+            return order[1] if order[0] == origin else order[0]
+        u = rng.random() * size
+        if own < last and u >= total[own] - own_pull:
+            u += own_pull
+        return order[min(np.searchsorted(total[:last], u, side='right'), last - 1)]
+
+    def choose_near(self, origin, rng, reach):
+        indptr, indices, distances = self.neighbours
+        start, end = indptr[origin], indptr[origin + 1]
+        if start == end:
+            #no other upazila at all
+            return None
+        if reach is not None:
+            #the upazilas within reach, or the nearest one if none are
+            end = start + min(max(np.searchsorted(distances[start:end], reach, side='right'), 1), end - start)
+        near, distance = indices[start:end], distances[start:end]
+        weights = np.nan_to_num(self.wtp[near] * self.jobs[near])
+        if self.decay == 'exponential':
+            weights = weights * np.exp(-distance / self.decay_km)
+        elif self.decay == 'gravity':
+            weights = weights / (1 + distance / self.decay_km)**2
+        #nearest first among upazilas with the same pull
+        order = np.argsort(-weights, kind='stable')
+        if self.k is not None:
+            order = order[:self.k]
+        if self.method == 'max' or len(order) == 1:
+            return near[order[0]]
+        if self.method == 'top_k':
+            return near[order[rng.integers(0, len(order))]]
+        total = np.cumsum(weights[order])
+        if total[-1] <= 0:
+            return near[order[0]]
+        return near[order[min(np.searchsorted(total, rng.random() * total[-1], side='right'), len(order) - 1)]]
+
+    def get_state(self):
+        return {'wtp': self.wtp.copy(), 'jobs': self.jobs.copy()}
+
+    def set_state(self, state):
+        self.wtp = np.array(state['wtp'], dtype=np.float64)
+        self.jobs = np.array(state['jobs'], dtype=np.float64)
+        self.ranked = None
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ensemble runner for ABM
+ of environmental migration
+
+Runs the model for every combination of a parameter grid (senario,
+ decision, network type, comm_scale, w1..w3, k, threshold and seed)
+ in a pool of worker processes. The census, upazila shapefile and the
+ hazards of each senario are loaded once in the main process and
+ shared with the workers. runs.csv in the output folder keeps the
+ parameters, settings (ticks, factor, binary, ...) and status of each
+ run, and failures.log the traceback of runs that failed. Every run is
+ saved with its number in runs.csv as its run: a run with the same
+ parameters and settings as one already there keeps its number, so a
+ sweep that stopped part way can be resumed, and any other run is
+ numbered after the runs already there, so a different sweep into the
+ same folder does not overwrite them.
+
+Can be used from python, e.g.
+    run_ensemble({'senario':[119,585],'decision':['hybrid','tpb'],'seed':[1,2,3]}, ticks=360, workers=4)
+ or from the command line, e.g.
+    python ensemble.py --senario 119 585 --decision hybrid tpb --seed 1 2 3 --ticks 360 --workers 4
+"""
+
+#import packages
+import argparse
+import itertools
+import multiprocessing as mp
+import os
+import time
+import traceback
+import numpy as np
+import pandas as pd
+from ABM_model_steps import *
+
+#parameters that can be swept, and their value when they are not
+DEFAULTS = {'senario': 119, 'decision': 'hybrid', 'network_type': 'random', 'comm_scale': 0.4,
+            'w1': 0.15, 'w2': 0.15, 'w3': 0.7, 'k': 10, 'threshold': 20, 'seed': 0}
+
+#parameters that are the same for every run of a sweep
+SETTINGS = {'mig_util': 400, 'mig_threshold': 1000, 'wealth_factor': 3000, 'ag_factor': 100, 'shock_method': 'weather',
+            'factor': 10000, 'binary': False, 'testing': False}
+
+#settings recorded in runs.csv, a run is only the same as an earlier one if these are the same too
+RUN_SETTINGS = list(SETTINGS) + ['ticks']
+
+#inputs shared by all runs, set in the main process before the workers are started
+_shared = {}
+
+def make_grid(grid):
+    #every combination of the values in grid (parameter -> list of values), in a fixed order
+    grid = {name: list(values) if isinstance(values, (list, tuple)) else [values] for name, values in grid.items()}
+    unknown = set(grid) - set(DEFAULTS)
+    if unknown:
+        raise ValueError('cannot sweep over ' + ', '.join(sorted(unknown)))
+    names = list(DEFAULTS)
+    values = [grid.get(name, [DEFAULTS[name]]) for name in names]
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+def load_inputs(senarios, settings):
+    #read the census, the upazilas and the hazards of every senario once
+    return {'census': read_census(settings['testing']),
+            'gdf': read_upazilas(),
+            'hazards': {senario: load_weather(senario, settings['binary'], cache_dir=settings.get('weather_cache', 'weather_cache'))
+                        for senario in senarios}}
+
+def _set_shared(shared):
+    _shared.update(shared)
+
+def run_one(run, params, settings, ticks, out):
+    #build and run one model, seeded from params['seed'], and save it as run number run
+    start = time.time()
+    try:
+        model = ABM_Model(params['decision'], settings['mig_util'], settings['mig_threshold'], settings['wealth_factor'],
+                          settings['ag_factor'], params['comm_scale'], settings['shock_method'], params['network_type'],
+                          params['w1'], params['w2'], params['w3'], params['k'], params['threshold'], params['senario'],
+                          testing=settings['testing'], factor=settings['factor'], binary=settings['binary'],
+                          writer=parquet_writer(out), census=_shared['census'], gdf=_shared['gdf'],
+                          hazards=_shared['hazards'][params['senario']], seed=params['seed'])
+        model.run(ticks)
+        model.save_files(run)
+        return run, 'done', time.time() - start, ''
+    except Exception:
+        return run, 'failed', time.time() - start, traceback.format_exc()
+
+def _run_one(job):
+    return run_one(*job)
+
+def number(text):
+    #command line value of a numeric parameter, an int if it is one
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+def run_key(run):
+    #parameters and settings of a run (a dict or a row of runs.csv), compared as numbers where they are numbers
+    #as they come back from runs.csv as either
+    key = []
+    for name in list(DEFAULTS) + RUN_SETTINGS:
+        value = run.get(name)
+        try:
+            key.append(float(value))
+        except (TypeError, ValueError):
+            key.append(str(value))
+    return tuple(key)
+
+def read_manifest(out):
+    path = os.path.join(out, 'runs.csv')
+    if os.path.exists(path):
+        return pd.read_csv(path, index_col='run')
+    return pd.DataFrame()
+
+def run_ensemble(grid, ticks=360, workers=None, out='model_output', resume=True, **settings):
+    #run every combination of grid, skipping runs already done in out when resume is True
+    #settings overrides SETTINGS, returns the manifest of the sweep
+    settings = {**SETTINGS, **settings}
+    runs = make_grid(grid)
+    os.makedirs(out, exist_ok=True)
+
+    #runs already in runs.csv keep their numbers, new ones are numbered after them
+    done = read_manifest(out)
+    numbers = {}
+    for run, row in done.iterrows():
+        numbers.setdefault(run_key(row), run)
+    next_run = done.index.max() + 1 if len(done) else 0
+    rows, index = [], []
+    for params in runs:
+        row = {**params, **{name: settings[name] for name in SETTINGS}, 'ticks': ticks}
+        key = run_key(row)
+        if key not in numbers:
+            numbers[key] = next_run
+            next_run += 1
+        rows.append(row)
+        index.append(numbers[key])
+    manifest = pd.DataFrame(rows, index=pd.Index(index, name='run'))
+    manifest['status'] = 'pending'
+    manifest['elapsed'] = np.nan
+    runs = dict(zip(index, runs))
+
+    #a run is only skipped if it was done with the same parameters and settings
+    if resume and len(done):
+        for run in manifest.index.intersection(done.index):
+            if done.loc[run, 'status'] == 'done':
+                manifest.loc[run, ['status', 'elapsed']] = done.loc[run, ['status', 'elapsed']].values
+    todo = [(run, params, settings, ticks, out) for run, params in runs.items() if manifest.loc[run, 'status'] != 'done']
+
+    #the inputs are loaded once here; forked workers share them, otherwise each worker gets a copy
+    shared = load_inputs(sorted({params['senario'] for _, params, _, _, _ in todo}), settings)
+    if 'fork' in mp.get_all_start_methods():
+        _set_shared(shared)
+        context, initargs = mp.get_context('fork'), ({},)
+    else:
+        context, initargs = mp.get_context('spawn'), (shared,)
+
+    with context.Pool(workers, initializer=_set_shared, initargs=initargs) as pool:
+        for run, status, elapsed, error in pool.imap_unordered(_run_one, todo):
+            manifest.loc[run, ['status', 'elapsed']] = [status, elapsed]
+            if error:
+                with open(os.path.join(out, 'failures.log'), 'a') as f:
+                    f.write('run ' + str(run) + ' ' + str(runs[run]) + '\n' + error + '\n')
+            print('run', run, status, 'in', round(elapsed / 60, 2), 'mins')
+            #written after every run so an interrupted sweep can be resumed
+            write_manifest(out, done, manifest)
+    write_manifest(out, done, manifest)
+    return manifest
+
+def write_manifest(out, done, manifest):
+    #the runs of this sweep, and the other runs that were already in runs.csv
+    pd.concat([done.drop(manifest.index.intersection(done.index)), manifest]).sort_index().to_csv(os.path.join(out, 'runs.csv'))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the migration ABM for every combination of the given parameters.')
+    for name, default in DEFAULTS.items():
+        parser.add_argument('--' + name, nargs='+', type=str if isinstance(default, str) else number, default=[default])
+    parser.add_argument('--ticks', type=int, default=360, help='number of months to run each model for')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes, all cores by default')
+    parser.add_argument('--out', default='model_output', help='folder for the output and runs.csv')
+    parser.add_argument('--factor', type=int, default=SETTINGS['factor'], help='number of people per agent')
+    parser.add_argument('--binary', action='store_true', help='use the binary weather checker')
+    parser.add_argument('--testing', action='store_true', help='use the testing census')
+    parser.add_argument('--no-resume', dest='resume', action='store_false', help='rerun runs that are already done')
+    args = parser.parse_args(argv)
+    grid = {name: getattr(args, name) for name in DEFAULTS}
+    manifest = run_ensemble(grid, ticks=args.ticks, workers=args.workers, out=args.out, resume=args.resume,
+                            factor=args.factor, binary=args.binary, testing=args.testing)
+    failed = manifest.index[manifest.status == 'failed']
+    if len(failed):
+        print(len(failed), 'runs failed, see', os.path.join(args.out, 'failures.log'))
+    return 1 if len(failed) else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
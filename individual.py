@@ -9,37 +9,66 @@ Working definition of individual class for ABM
 
 #import packages
 from decisions import *
+from agent_store import *
+from rng import *
 import numpy as np
 import pandas as pd
 
 class Individual :
-    next_uid = 1
-
-    def __init__(self, ag_factor,ID): #initialize
-        self.unique_id = Individual.next_uid
-        Individual.next_uid += 1
-        self.age = np.random.weibull(1.68) * 33.6
-        gend_arr = ['M', 'F']
-        self.gender = np.random.choice(gend_arr, 1)
-        self.hh = None
-        self.employment = None
-        self.salary = 0
-        self.employer = None
-        self.can_migrate  = False
-        self.head = False
-        self.migrated = False
-        self.ag_factor = ag_factor
-        self.alive = True 
-        self.wta = 0 
-        self.originally_from=ID
-        self.currently_living=ID
-        self.mig_dest=None
-        #self.mig_id=None
+    #attributes are stored in the columns of an individual_store
+    unique_id = column('id')
+    age = column('age')
+    gender = column('gender')
+    salary = column('salary')
+    employer = column('employer')
+    can_migrate = column('can_migrate')
+    head = column('head')
+    migrated = column('migrated')
+    ag_factor = column('ag_factor')
+    alive = column('alive')
+    wta = column('wta')
+    originally_from = column('originally_from')
+    currently_living = column('currently_living')
+
+    @classmethod
+    def view(cls, store, row):
+        #object for an individual already in the store, e.g. made by make_individuals or read from a checkpoint
+        ind = cls.__new__(cls)
+        ind.store = store
+        ind.row = row
+        store.objects.append(ind)
+        return ind
+
+    @property
+    def hh(self):
+        #row of the household in the household store, None if not in a household
+        hh = self.store.data['hh'][self.row]
+        return None if hh < 0 else hh
+
+    @hh.setter
+    def hh(self, value):
+        self.store.data['hh'][self.row] = -1 if value is None else value
 
+    @property
+    def employment(self):
+        return EMPLOYMENT_TYPES[self.store.data['employment'][self.row]]
+
+    @employment.setter
+    def employment(self, value):
+        self.store.data['employment'][self.row] = EMPLOYMENT_CODE[value]
+
+    @property
+    def mig_dest(self):
+        dest = self.store.data['mig_dest'][self.row]
+        return None if np.isnan(dest) else int(dest)
+
+    @mig_dest.setter
+    def mig_dest(self, value):
+        self.store.data['mig_dest'][self.row] = np.nan if value is None else value
 
     def age_up(self):
         self.age = self.age + 1
-        self.salary = 0 
+        self.salary = 0
 
     def check_eligibility(self):
         #is the agent eligible to migrate?
@@ -47,34 +76,46 @@ class Individual :
             self.can_migrate = True
 
         #individuals look for work within community
-    def find_work(self, hh_set, mig_util): 
+    def find_work(self, households, mig_util):
         #look for ag in own land first
         #util_migrate = mig_util #global var
-        my_hh = hh_set[hh_set['hh_id'] == self.hh]
-        
         if self.hh == None:
             return
-        
-        else:
-            if my_hh.empty:
-                print('hh is empty')
-                print('looking for hh:',self.hh)
-                print(hh_set)
-            my_house = my_hh.loc[0,'household']
-            
-            if type(my_house)==pd.Series:
-                my_house=my_house.iloc[0]
-        
+        my_house = households.objects[self.hh]
+
         #too young to work?
         if self.age < 14 or self.gender != 'M' or self.age>70: #should this be "or"?
             self.employment = 'None'
             self.salary = 0
         #work in ag on own land
-        elif my_house.land_impacted == False and my_house.land_owned > 20 and my_hh.type[0]!='migrant': #making this 100 for new land dist, previously 20
+        elif my_house.land_impacted == False and my_house.land_owned > 20 and my_house.type!='migrant': #making this 100 for new land dist, previously 20
             self.employment = "SelfAg"
-            self.salary = my_house.land_owned * self.ag_factor * 2 #/ my_house.hh_size 
+            self.salary = my_house.land_owned * self.ag_factor * 2 #/ my_house.hh_size
 
         else:
-            self.employment = "Looking" 
+            self.employment = "Looking"
             self.wta = my_house.wta
-            self.salary = 0  
+            self.salary = 0
+
+#batched steps
+#check_eligibility and find_work for a whole set of individuals at once from the columns of the stores
+
+def find_work_batch(people, households, rows):
+    age, male = people.age[rows], people.gender[rows] == 'M'
+    people.can_migrate[rows[(35 > age) & (age >= 14) & male & ~people.migrated[rows]]] = True
+
+    rows = rows[people.hh[rows] >= 0]
+    age, male, hh = people.age[rows], people.gender[rows] == 'M', people.hh[rows]
+    #too young to work?
+    too_young = (age < 14) | ~male | (age > 70)
+    own_land = ~too_young & ~households.land_impacted[hh] & (households.land_owned[hh] > 20) & (households.type[hh] != 'migrant')
+    looking = ~too_young & ~own_land
+
+    people.employment[rows[too_young]] = EMPLOYMENT_CODE['None']
+    people.salary[rows[too_young]] = 0
+    #work in ag on own land
+    people.employment[rows[own_land]] = EMPLOYMENT_CODE['SelfAg']
+    people.salary[rows[own_land]] = households.land_owned[hh[own_land]] * people.ag_factor[rows[own_land]] * 2
+    people.employment[rows[looking]] = EMPLOYMENT_CODE['Looking']
+    people.wta[rows[looking]] = households.wta[hh[looking]]
+    people.salary[rows[looking]] = 0
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Household networks for ABM
+ of environmental migration
+
+The network of an upazila is kept as a CSR adjacency over its
+ households (numbered by hh id - 1): the neighbours of household i are
+ indices[indptr[i]:indptr[i+1]]. Summing a value over the neighbours of
+ every household is then one cumulative sum.
+
+The networks are generated straight into arrays, without networkx:
+ random (G(n,p)) networks by skipping between edges with geometric
+ gaps, small world (Watts-Strogatz) networks by rewiring a ring
+ lattice, and preferential (Barabasi-Albert) networks from a list of
+ nodes repeated by their degree. A fully connected network has no
+ indices at all (indices is None), as every household is a neighbour
+ of all the others.
+"""
+
+#import packages
+import numpy as np
+
+#number of possible edges a random network draws at a time
+CHUNK = 1 << 20
+
+def index_dtype(n):
+    return np.int32 if n < 2**31 else np.int64
+
+def edges_to_csr(n, source, target):
+    #indptr, indices of the undirected network of n nodes with edges source[i]-target[i]
+    dtype = index_dtype(n)
+    source = np.asarray(source, dtype=dtype)
+    target = np.asarray(target, dtype=dtype)
+    both = np.concatenate([source, target])
+    order = np.argsort(both, kind='stable')
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(both, minlength=n))
+    return indptr, np.concatenate([target, source])[order]
+
+def complete_csr(n):
+    #fully connected network, every node has the n - 1 others as neighbours
+    return np.arange(n + 1, dtype=np.int64) * max(n - 1, 0), None
+
+def empty_csr(n):
+    return np.zeros(n + 1, dtype=np.int64), np.zeros(0, dtype=index_dtype(n))
+
+def gnp_edges(n, p, rng):
+    #edges (i, j) of a random network, in chunks sorted by i then j
+    #possible edge k is (i, j) with j < i and k = i(i-1)/2 + j, only the edges that are there are drawn
+    dtype = index_dtype(n)
+    possible = n * (n - 1) // 2
+    #small networks draw about as many gaps as they have edges rather than a whole chunk
+    chunk = int(min(CHUNK, p * possible + 5 * np.sqrt(p * possible) + 100))
+    k = -1
+    while k < possible:
+        k = k + np.cumsum(rng.geometric(p, chunk), dtype=np.int64)
+        edges = k[k < possible]
+        k = k[-1]
+        i = np.floor((1 + np.sqrt(1 + 8 * edges.astype(np.float64))) / 2).astype(np.int64)
+        #correct any rounding of the square root
+        i -= i * (i - 1) // 2 > edges
+        i += (i + 1) * i // 2 <= edges
+        yield i.astype(dtype), (edges - i * (i - 1) // 2).astype(dtype)
+
+def gnp_csr(n, p, rng):
+    #random network where each of the n(n-1)/2 possible edges is there with probability p
+    #the edges are drawn twice from the same state of rng, once to count the neighbours of each node and
+    #once to put them in place, so only the adjacency itself has to fit in memory
+    if p <= 0 or n < 2:
+        return empty_csr(n)
+    if p >= 1:
+        return complete_csr(n)
+    state = rng.bit_generator.state
+    below = np.zeros(n, dtype=np.int64)
+    above = np.zeros(n, dtype=np.int64)
+    for i, j in gnp_edges(n, p, rng):
+        below += np.bincount(i, minlength=n)
+        above += np.bincount(j, minlength=n)
+    rng.bit_generator.state = state
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(below + above)
+    indices = np.empty(indptr[-1], dtype=index_dtype(n))
+    #each node has its neighbours below it first, then the ones above it
+    next_below = indptr[:-1].copy()
+    next_above = indptr[:-1] + below
+    for i, j in gnp_edges(n, p, rng):
+        #edges come sorted by i, so the place of each one among the neighbours of i is its place in the chunk
+        first = np.searchsorted(i, i)
+        indices[next_below[i] + np.arange(len(i)) - first] = j
+        next_below += np.bincount(i, minlength=n)
+        order = np.argsort(j, kind='stable')
+        j, i = j[order], i[order]
+        first = np.searchsorted(j, j)
+        indices[next_above[j] + np.arange(len(j)) - first] = i
+        next_above += np.bincount(j, minlength=n)
+    return indptr, indices
+
+def watts_strogatz_csr(n, k, p, rng):
+    #ring where each node is joined to its k // 2 nearest neighbours on each side, then each edge
+    #has its far end moved to a random node with probability p (never making a loop or a double edge)
+    if k >= n:
+        return complete_csr(n)
+    half = k // 2
+    source = np.tile(np.arange(n, dtype=np.int64), half)
+    target = (source + np.repeat(np.arange(1, half + 1), n)) % n
+    moving = np.flatnonzero(rng.random(len(source)) < p)
+    for attempt in range(100):
+        if len(moving) == 0:
+            break
+        target[moving] = rng.integers(0, n, len(moving))
+        key = np.minimum(source, target) * n + np.maximum(source, target)
+        _, inverse, counts = np.unique(key, return_inverse=True, return_counts=True)
+        bad = (source == target) | (counts[inverse] > 1)
+        moving = moving[bad[moving]]
+    #edges that still could not be moved are left out
+    keep = np.ones(len(source), dtype=bool)
+    keep[moving] = False
+    return edges_to_csr(n, source[keep], target[keep])
+
+def barabasi_albert_csr(n, m, rng):
+    #starting from a star of m + 1 nodes, each new node joins m different nodes chosen with probability
+    #proportional to their degree
+    if m >= n:
+        return complete_csr(n)
+    n_edges = m + (n - m - 1) * m
+    source = np.empty(n_edges, dtype=np.int64)
+    target = np.empty(n_edges, dtype=np.int64)
+    source[:m] = 0
+    target[:m] = np.arange(1, m + 1)
+    #every node appears once for each of its edges
+    repeated = np.empty(2 * n_edges, dtype=np.int64)
+    repeated[:m] = 0
+    repeated[m:2 * m] = np.arange(1, m + 1)
+    size = 2 * m
+    edge = m
+    for new in range(m + 1, n):
+        chosen = np.unique(repeated[rng.integers(0, size, m)])
+        while len(chosen) < m:
+            chosen = np.unique(np.concatenate([chosen, repeated[rng.integers(0, size, m - len(chosen))]]))
+        source[edge:edge + m] = new
+        target[edge:edge + m] = chosen
+        repeated[size:size + m] = chosen
+        repeated[size + m:size + 2 * m] = new
+        size += 2 * m
+        edge += m
+    return edges_to_csr(n, source, target)
+
+def neighbour_sum(indptr, indices, values):
+    #sum of values over the neighbours of every node
+    if indices is None:
+        return values.sum() - values
+    total = np.concatenate([[0], np.cumsum(values[indices])])
+    return total[indptr[1:]] - total[indptr[:-1]]
+
+def neighbours(indptr, indices, node):
+    if indices is None:
+        return np.delete(np.arange(len(indptr) - 1), node)
+    return indices[indptr[node]:indptr[node + 1]]
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Output writers for ABM
+ of environmental migration
+
+A writer saves the data recorded by a model run. parquet_writer (the
+ default) writes a parquet dataset partitioned by senario, method,
+ network type, binary or normalised weather, run and upazila, which
+ load_output reads back one partition and column at a time. A model
+ saved without a run number is run -1, so it never replaces a numbered
+ run. excel_writer writes the workbooks the model used to write, and
+ one of the totals of each upazila.
+"""
+
+#import packages
+import os
+import pandas as pd
+
+#columns that identify a household in the member table
+MEMBER_KEYS = ['tick','upazila','hh_id']
+#run partition of a model saved without a run number
+NO_RUN = -1
+
+class parquet_writer :
+    #tables: households (one row per household per tick), members (one row per member of a
+    #household per tick), migrants (one row per tick) and upazilas (the totals of each upazila per tick)
+    def __init__(self, root='model_output'):
+        self.root = root
+
+    def write(self, model, run=None):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        partitions = {'senario': int(model.senario), 'method': str(model.decision), 'network': str(model.network_type),
+                      'binary': str(model.ft), 'run': NO_RUN if run is None else int(run)}
+        households, members = model.recorder.to_tables(MEMBER_KEYS)
+        members = members.rename(columns={'employment type':'employment', 'agent IDs':'agent_id', 'living in':'living_in'})
+        migrants = model.mig_df.reset_index(drop=True)
+        upazilas = model.upazila_totals()
+
+        for name, table, by in [('households', households, ['upazila']), ('members', members, ['upazila']), ('migrants', migrants, []),
+                                ('upazilas', upazilas, [])]:
+            table = table.assign(**partitions)
+            #rewriting a run replaces its old partitions
+            ds.write_dataset(pa.Table.from_pandas(table, preserve_index=False), os.path.join(self.root, name), format='parquet',
+                             partitioning=list(partitions) + by, partitioning_flavor='hive',
+                             existing_data_behavior='delete_matching')
+
+class excel_writer :
+    #one sheet per upazila and a separate workbook with the number of migrants, as the model used to save
+    def write(self, model, run=None):
+        x=model.senario
+        y=model.decision
+        z=model.network_type
+        prefix='' if run is None else str(run)+'_'
+
+        # Create an Excel writer object
+        excel_writer = pd.ExcelWriter(prefix+"model_senario_"+str(x)+"_method_"+str(y)+"_network_type_"+str(z)+'_binary_'+(model.ft)+".xlsx", engine='xlsxwriter')
+        for ID in model.df_hh.index:
+            # Write each DataFrame to a different sheet named by ID
+            model.data_set(ID).to_excel(excel_writer, sheet_name=str(ID))
+
+        # Save the Excel file
+        excel_writer.close()
+        model.mig_df.to_excel(prefix+'number_migrants_senario_'+str(x)+"_method_"+str(y)+"_network_type_"+str(z)+'_binary_'+(model.ft)+".xlsx")
+        model.upazila_totals().to_excel(prefix+'upazila_totals_senario_'+str(x)+"_method_"+str(y)+"_network_type_"+str(z)+'_binary_'+(model.ft)+".xlsx", index=False)
+
+def load_output(table, root='model_output', columns=None, **partitions):
+    #read a table written by parquet_writer, only the columns asked for (all if None) and only the
+    #partitions matching the keyword arguments, e.g. load_output('migrants', senario=119, binary='false', run=1)
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(os.path.join(root, table), format='parquet', partitioning='hive')
+    condition = None
+    for name, value in partitions.items():
+        match = ds.field(name).isin(value) if isinstance(value, (list, tuple)) else ds.field(name) == value
+        condition = match if condition is None else condition & match
+    return dataset.to_table(columns=columns, filter=condition).to_pandas()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Synthetic population for ABM
+ of environmental migration
+
+Makes all the individuals and households of an upazila at once, and
+ the migrant households of a destination. This is the only way agents
+ are made: Individual, Household and Migrant objects are views of the
+ rows made here (Weibull ages, an even gender split, Poisson household
+ sizes, normal wealth and Pareto land). Households are filled by shuffling the
+ individuals and cutting them into consecutive groups of the household
+ sizes, and the head of each household is its oldest man, or its
+ oldest woman if it has no men, found for all households in one sort.
+"""
+
+#import packages
+from agent_store import *
+from individual import Individual
+from hh_class import Household
+from hh_class_for_mirgants import Migrant
+import numpy as np
+
+def make_individuals(people, n, ID, ag_factor, rng):
+    #n new individuals living in upazila ID, returns their rows
+    rows = people.add(n)
+    people.data['id'][rows] = rows + 1
+    people.data['age'][rows] = rng.weibull(1.68, n) * 33.6
+    people.data['gender'][rows] = rng.choice(['M', 'F'], n)
+    people.data['ag_factor'][rows] = ag_factor
+    people.data['originally_from'][rows] = ID
+    people.data['currently_living'][rows] = ID
+    for row in rows:
+        Individual.view(people, row)
+    return rows
+
+def make_households(households, people, individual_set, ID, n, size, wealth_factor, ag_factor, w1, w2, w3, k, threshold, rng):
+    #n new households in upazila ID with on average size members, taken from the individuals in
+    #individual_set that are not in a household yet. returns their rows, in order of hh id
+    rows = households.add(n)
+    hh = households.data
+    hh['hh_id'][rows] = np.arange(1, n + 1)
+    hh['upazila'][rows] = ID
+    hh['wealth'][rows] = rng.normal(wealth_factor, wealth_factor / 5, n) #adjust this for comm inequality
+    hh_size = np.maximum(rng.poisson(size, n), 1)
+    hh['hh_size'][rows] = hh_size
+    ### set up community inequality ###
+    gini = 0.55 #gini index from BEMS is 0.55
+    alpha = (1.0 / gini + 1.0) / 2.0
+    hh['weights'][rows] = rng.pareto(alpha, n)
+    hh['land_owned'][rows] = hh['weights'][rows] * 14
+    hh['wellbeing_threshold'][rows] = hh_size * 20000 #world bank poverty threshold
+    hh['expenses'][rows] = hh_size * 20000 #this represents $$ to sustain HH (same as threshold)
+    hh['land_prod'][rows] = ag_factor * hh['land_owned'][rows] #productivity from own land
+    hh['rootedness'][rows] = rng.random(n)
+    for row in rows:
+        Household.view(households, row, wealth_factor, ag_factor, w1, w2, w3, k, threshold)
+
+    #households take their members in turn from the shuffled individuals until there are none left
+    free = rng.permutation(individual_set[people.hh[individual_set] == -1])
+    ends = np.minimum(np.cumsum(hh_size), len(free))
+    lengths = np.diff(ends, prepend=0)
+    chosen = free[:ends[-1]] if n else free[:0]
+    home = np.repeat(rows, lengths)
+    people.hh[chosen] = home
+    people.origin_hh[chosen] = home
+    for row, members in zip(rows, np.split(chosen, ends[:-1])):
+        households.members[row].extend(members.tolist())
+    assign_heads(households, people, chosen, home)
+    return rows
+
+def make_migrants(households, people, migrants, ID, first_id, wealth_factor, ag_factor, w1, w2, w3, k, threshold, rng):
+    #a new migrant household in upazila ID for each individual in migrants, with hh ids from first_id on and
+    #the migrant as its only member and head. returns their rows
+    n = len(migrants)
+    rows = households.add(n)
+    hh = households.data
+    hh['hh_id'][rows] = np.arange(first_id, first_id + n)
+    hh['upazila'][rows] = ID
+    hh['type'][rows] = 'migrant'
+    hh['wealth'][rows] = rng.normal(wealth_factor, wealth_factor / 5, n)
+    hh_size = np.maximum(rng.poisson(5.13, n), 1)
+    hh['hh_size'][rows] = hh_size
+    gini = 0.55
+    alpha = (1.0 / gini + 1.0) / 2.0
+    hh['weights'][rows] = rng.pareto(alpha, n)
+    hh['wellbeing_threshold'][rows] = hh_size * 20000
+    hh['expenses'][rows] = hh_size * 20000
+    hh['rootedness'][rows] = rng.random(n)
+    for row, migrant in zip(rows, migrants):
+        Migrant.view(households, row, wealth_factor, ag_factor, w1, w2, w3, k, threshold)
+        households.members[row].append(migrant)
+    hh['head'][rows] = migrants
+    people.hh[migrants] = rows
+    people.head[migrants] = True
+    return rows
+
+def assign_heads(households, people, chosen, home):
+    #head of each household with members: men before women, then the oldest
+    order = np.lexsort((-people.age[chosen], people.gender[chosen] != 'M', home))
+    first = np.unique(home[order], return_index=True)[1]
+    heads = chosen[order[first]]
+    households.head[home[order[first]]] = heads
+    people.head[heads] = True
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Recording of household level model output for ABM
+ of environmental migration
+
+Each field is kept in a typed numpy array that doubles in size when it
+ is full, fields holding a list per household (e.g. the ids of the
+ members) as one array of values plus the length of each list, so
+ recording stays O(households) per tick. With an output folder the
+ records are written to a parquet file every flush_every ticks and the
+ arrays are reused for the next ticks, otherwise they are kept in memory.
+"""
+
+#import packages
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+class column_buffer :
+    #one field of the records, appended to as the model runs
+    def __init__(self, capacity=1024):
+        self.n = 0
+        self.data = None
+        self.capacity = max(int(capacity), 1)
+
+    @property
+    def values(self):
+        return self.data[:self.n] if self.data is not None else np.empty(0)
+
+    def append(self, values):
+        values = np.asarray(values)
+        k = len(values)
+        if self.data is None:
+            self.data = np.empty(max(self.capacity, k), dtype=values.dtype)
+        #double the array when full so appending stays cheap, and widen it if the values need a wider type
+        size = len(self.data) if self.n + k <= len(self.data) else max(len(self.data) * 2, self.n + k)
+        dtype = np.result_type(self.data.dtype, values.dtype)
+        if size != len(self.data) or dtype != self.data.dtype:
+            grown = np.empty(size, dtype=dtype)
+            grown[:self.n] = self.data[:self.n]
+            self.data = grown
+        self.data[self.n:self.n + k] = values
+        self.n += k
+
+    def clear(self):
+        #the array is kept to be filled again
+        self.n = 0
+
+class recorder :
+    def __init__(self, fields, list_fields=(), labels={}, path=None, flush_every=12):
+        self.columns = list(fields) #names of all fields, in the order they are output
+        self.list_fields = list(list_fields) #names of the fields with a list of values per household
+        self.fields = [name for name in self.columns if name not in self.list_fields]
+        self.labels = labels #fields stored as integer codes, and the label of each code
+        self.path = path #folder for the parquet files, None to keep everything in memory
+        self.flush_every = flush_every
+        self.ticks = 0
+        self.parts = 0
+        #records not written yet (all of them without a path), a buffer per field and
+        #the length of each list and all the values of the list fields
+        self.values = {name: column_buffer() for name in self.fields}
+        self.lengths = {name: column_buffer() for name in self.list_fields}
+        self.flat = {name: column_buffer() for name in self.list_fields}
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    def record(self, values, lists):
+        #values: field -> array (or a single value for all households)
+        #lists: list field -> (number of values of each household, all values one after the other)
+        n = len(next(iter(lists.values()))[0])
+        self.append({**{name: np.broadcast_to(np.asarray(values[name]), (n,)) for name in self.fields}, **lists})
+
+    def block(self):
+        #the records in the buffers, list fields as (lengths, values)
+        block = {name: self.values[name].values for name in self.fields}
+        for name in self.list_fields:
+            block[name] = (self.lengths[name].values, self.flat[name].values)
+        return block
+
+    def end_tick(self):
+        self.ticks += 1
+        if self.ticks % self.flush_every == 0:
+            self.flush()
+
+    def flush(self):
+        #write the records in the buffers to parquet if there is an output folder, and empty them
+        if self.path is None or self.values[self.fields[0]].n == 0:
+            return
+        self.write(self.block())
+        for buffer in [*self.values.values(), *self.lengths.values(), *self.flat.values()]:
+            buffer.clear()
+
+    def append(self, block):
+        for name in self.fields:
+            self.values[name].append(block[name])
+        for name in self.list_fields:
+            lengths, flat = block[name]
+            self.lengths[name].append(np.asarray(lengths, dtype=np.int64))
+            self.flat[name].append(flat)
+
+    def write(self, block):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        columns = {}
+        for name in self.fields:
+            columns[name] = pa.array(block[name])
+        for name in self.list_fields:
+            lengths, flat = block[name]
+            offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int32)
+            if name in self.labels:
+                flat = self.labels[name][flat]
+            columns[name] = pa.ListArray.from_arrays(pa.array(offsets), pa.array(flat))
+        pq.write_table(pa.table(columns), os.path.join(self.path, 'part-%05d.parquet' % self.parts))
+        self.parts += 1
+
+    def close(self):
+        self.flush()
+
+    def get_state(self):
+        #records kept so far and how many parts have been written, e.g. to save a run part way through
+        #(copied, as the buffers are filled again after a flush)
+        block = {name: tuple(np.copy(v) for v in value) if name in self.list_fields else np.copy(value) for name, value in self.block().items()}
+        return {'ticks': self.ticks, 'parts': self.parts, 'path': self.path, 'block': block}
+
+    def set_state(self, state):
+        #parts written to another folder (state['path']) are copied into this one, parts of this
+        #folder that come after them are from a later point of the run and are removed
+        as_block = lambda b: {name: tuple(b[name]) if name in self.list_fields else np.asarray(b[name]) for name in self.columns}
+        #states saved before the buffers kept the records as a list of blocks
+        blocks = [state['block']] if 'block' in state else [*state['blocks'], *state['pending']]
+        self.ticks = state['ticks']
+        self.parts = 0
+        self.values = {name: column_buffer() for name in self.fields}
+        self.lengths = {name: column_buffer() for name in self.list_fields}
+        self.flat = {name: column_buffer() for name in self.list_fields}
+        for block in blocks:
+            self.append(as_block(block))
+        if self.path is None:
+            if state['parts'] > 0:
+                raise ValueError('records of the run are written in ' + str(state['path']) + ', a path is needed to carry on recording')
+            return
+        for name in os.listdir(self.path):
+            if name.startswith('part-') and int(name[5:10]) >= state['parts']:
+                os.remove(os.path.join(self.path, name))
+        if state['path'] is not None and os.path.abspath(state['path']) != os.path.abspath(self.path):
+            for part in range(state['parts']):
+                name = 'part-%05d.parquet' % part
+                shutil.copyfile(os.path.join(state['path'], name), os.path.join(self.path, name))
+        self.parts = state['parts']
+
+    def to_frame(self, upazila=None):
+        #everything recorded so far as one DataFrame, optionally for one upazila only
+        self.flush()
+        frames = []
+        if self.path is not None and self.parts > 0:
+            import pyarrow.parquet as pq
+            filters = None if upazila is None else [('upazila', '=', int(upazila))]
+            frames.append(pq.read_table(self.path, filters=filters).to_pandas())
+        if self.values[self.fields[0]].n:
+            block = self.block()
+            keep = slice(None) if upazila is None else block['upazila'] == int(upazila)
+            frame = pd.DataFrame({name: block[name][keep] for name in self.fields})
+            for name in self.list_fields:
+                lengths, flat = block[name]
+                if name in self.labels:
+                    flat = self.labels[name][flat]
+                lists = np.split(flat, np.cumsum(lengths)[:-1]) if len(lengths) else []
+                frame[name] = [l for l, k in zip(lists, keep) if k] if upazila is not None else lists
+            frames.append(frame[self.columns])
+        if not frames:
+            return pd.DataFrame(columns=self.columns)
+        return pd.concat(frames, ignore_index=True)[self.columns]
+
+    def to_tables(self, keys):
+        #everything recorded so far as two flat tables: one row per household with the single valued
+        #fields, and one row per list value with the keys of the household it belongs to
+        #(the list fields of a household must all be the same length)
+        self.flush()
+        households = []
+        values = []
+        lengths = []
+        if self.path is not None and self.parts > 0:
+            import pyarrow.parquet as pq
+            table = pq.read_table(self.path)
+            households.append(table.select(self.fields).to_pandas())
+            values.append({name: table[name].combine_chunks().flatten().to_numpy(zero_copy_only=False) for name in self.list_fields})
+            lengths.append(table[self.list_fields[0]].combine_chunks().value_lengths().to_numpy())
+        if self.values[self.fields[0]].n:
+            block = self.block()
+            households.append(pd.DataFrame({name: block[name] for name in self.fields}))
+            values.append({name: self.labels[name][block[name][1]] if name in self.labels else block[name][1] for name in self.list_fields})
+            lengths.append(block[self.list_fields[0]][0])
+        if not households:
+            return pd.DataFrame(columns=self.fields), pd.DataFrame(columns=list(keys) + self.list_fields)
+        households = pd.concat(households, ignore_index=True)
+        lengths = np.concatenate(lengths)
+        values = pd.DataFrame({name: np.concatenate([v[name] for v in values]) for name in self.list_fields})
+        keys = pd.DataFrame({key: np.repeat(households[key].values, lengths) for key in keys})
+        return households, pd.concat([keys, values], axis=1)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Registry of where every agent is for ABM
+ of environmental migration
+
+The registry keeps the rows of the individuals and households living in
+ each upazila, and for every individual its place among the rows of its
+ upazila. Together with the columns of the individual store (the
+ upazila and household an individual lives in and the ones it comes
+ from) an agent can be found from its id, or moved to another upazila,
+ without searching any upazila or the recorded history.
+
+An individual moving away leaves a gap in the rows of its upazila,
+ which is closed the next time the rows are read, so the rest keep the
+ order they were added in.
+"""
+
+#import packages
+import numpy as np
+
+class row_list :
+    #rows in the order they were added, in an array that doubles when full, with taken out rows set to -1
+    def __init__(self, rows=()):
+        rows = np.asarray(rows, dtype=np.int64)
+        self.data = np.empty(max(2 * len(rows), 16), dtype=np.int64)
+        self.data[:len(rows)] = rows
+        self.n = len(rows)
+        self.gaps = 0
+
+    def __len__(self):
+        return self.n - self.gaps
+
+    def append(self, rows):
+        #returns the places of the new rows
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.int64))
+        if self.n + len(rows) > len(self.data):
+            grown = np.empty(max(2 * len(self.data), self.n + len(rows)), dtype=np.int64)
+            grown[:self.n] = self.data[:self.n]
+            self.data = grown
+        start = self.n
+        self.data[start:start + len(rows)] = rows
+        self.n += len(rows)
+        return np.arange(start, self.n)
+
+    def take_out(self, places):
+        self.data[places] = -1
+        self.gaps += np.size(places)
+
+    def squeeze(self):
+        #close the gaps, returns False if there were none
+        if self.gaps == 0:
+            return False
+        rows = self.data[:self.n]
+        kept = rows[rows >= 0]
+        self.n = len(kept)
+        self.data[:self.n] = kept
+        self.gaps = 0
+        return True
+
+class agent_registry :
+    def __init__(self, people):
+        self.people = people
+        self.individual_rows = {} #upazila: row_list of the individuals living there
+        self.hh_rows = {} #upazila: row_list of its households, in order of hh id
+        self.place = np.full(1024, -1, dtype=np.int64) #place of each individual in the row_list of its upazila
+
+    def add_upazila(self, ID, individual_rows, hh_rows):
+        #rows of the individuals and households of upazila ID, as made by set_up_agents or read from a checkpoint
+        self.individual_rows[int(ID)] = row_list(individual_rows)
+        self.hh_rows[int(ID)] = row_list(hh_rows)
+        self.set_places(individual_rows, np.arange(len(individual_rows)))
+
+    def set_places(self, rows, places):
+        if len(rows) and rows.max() >= len(self.place):
+            grown = np.full(max(2 * len(self.place), rows.max() + 1), -1, dtype=np.int64)
+            grown[:len(self.place)] = self.place
+            self.place = grown
+        self.place[rows] = places
+
+    def individuals(self, ID):
+        #rows of the individuals living in upazila ID, a view that is only valid until someone moves
+        rows = self.individual_rows[int(ID)]
+        if rows.squeeze():
+            self.place[rows.data[:rows.n]] = np.arange(rows.n)
+        return rows.data[:rows.n]
+
+    def hh_set(self, ID):
+        #rows of the households in upazila ID, in order of hh id
+        rows = self.hh_rows[int(ID)]
+        return rows.data[:rows.n]
+
+    def household(self, ID, hh_id):
+        #row of household hh_id of upazila ID
+        return self.hh_rows[int(ID)].data[int(hh_id) - 1]
+
+    def add_households(self, ID, rows):
+        self.hh_rows[int(ID)].append(rows)
+
+    def row(self, agent_id):
+        #individuals are made with id = row + 1, so the id is an index into the store
+        return int(agent_id) - 1
+
+    def locate(self, agent_id):
+        #(upazila, household row, row) of where the individual lives now, then (upazila, household row) of where it is from
+        row = self.row(agent_id)
+        people = self.people
+        return ((people.currently_living[row], people.hh[row], row),
+                (people.originally_from[row], people.origin_hh[row]))
+
+    def move(self, rows, IDs, hh_rows):
+        #individuals rows go to live in households hh_rows of upazilas IDs, joining the rows of each upazila in
+        #the order they are given. every upazila they leave or go to is only gone over once
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.int64))
+        IDs = np.broadcast_to(np.asarray(IDs, dtype=np.int64), rows.shape)
+        people = self.people
+        leaving = people.currently_living[rows]
+        for ID in np.unique(leaving):
+            self.individual_rows[int(ID)].take_out(self.place[rows[leaving == ID]])
+        for ID in np.unique(IDs):
+            arriving = rows[IDs == ID]
+            self.set_places(arriving, self.individual_rows[int(ID)].append(arriving))
+        people.currently_living[rows] = IDs
+        people.hh[rows] = hh_rows
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Random number streams for ABM
+ of environmental migration
+
+All randomness in a model comes from one rng_service, seeded once.
+ Each (phase, upazila) pair gets its own numpy Generator, spawned from
+ the seed with the pair as its key, so a stream only depends on the
+ seed and on the calls made within that phase of that upazila. Upazilas
+ can therefore be stepped in any order, or at the same time, and still
+ give the same numbers.
+"""
+
+#import packages
+import numpy as np
+
+#phases of the model that draw random numbers
+PHASES = ('setup', 'network', 'schedule', 'land', 'auction', 'decision', 'migration', 'destination')
+
+class rng_service :
+    def __init__(self, seed=None):
+        #seed=None draws a fresh seed, which is kept in self.seed so the run can be repeated
+        self.seed = np.random.SeedSequence(seed).entropy
+        self.streams = {}
+
+    def stream(self, phase, ID=0):
+        #the generator of a phase in upazila ID, created the first time it is asked for
+        key = (phase, int(ID))
+        if key not in self.streams:
+            seed_seq = np.random.SeedSequence(self.seed, spawn_key=(PHASES.index(phase), int(ID)))
+            self.streams[key] = np.random.Generator(np.random.PCG64(seed_seq))
+        return self.streams[key]
+
+    def get_state(self):
+        #state of every stream made so far, e.g. to save a run part way through
+        return {'seed': self.seed, 'streams': {phase+':'+str(ID): gen.bit_generator.state for (phase, ID), gen in self.streams.items()}}
+
+    def set_state(self, state):
+        self.seed = state['seed']
+        self.streams = {}
+        for key, bit_state in state['streams'].items():
+            phase, ID = key.split(':')
+            self.stream(phase, int(ID)).bit_generator.state = bit_state
+
+#used by agents that are made or stepped outside a model, without a stream of their own
+default_stream = np.random.default_rng()
@@ -0,0 +1,19 @@
+#the modules of the model are at the top of the repository
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from benchmark import fake_census, fake_hazards, MODEL_ARGS
+from ABM_model_steps import ABM_Model
+
+@pytest.fixture
+def make_model():
+    #small model on made up inputs, as benchmark.py runs it, with upazilas coded 100000, 100010, ...
+    def make(ticks=12, n_upazilas=6, population=20000, **settings):
+        census = fake_census(n_upazilas, population)
+        settings = {'decision': 'tpb', 'network_type': 'random', 'factor': 100, 'seed': 0, 'gdf': 'not used',
+                    'population_cache': None, **settings}
+        return ABM_Model(testing=False, census=census, hazards=fake_hazards(census.index[:-1], ticks), **MODEL_ARGS, **settings)
+    return make
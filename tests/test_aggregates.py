@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the running totals of each upazila, run with
+    python -m pytest tests
+"""
+
+#import packages
+import numpy as np
+
+def test_totals_match_households(make_model):
+    #the running totals are the same as summing over the households at the end of every tick
+    model = make_model()
+    expected = []
+    data_collect = model.data_collect
+    def collect():
+        data_collect()
+        for ID in model.df_hh.index:
+            rows = model.registry.hh_set(ID)
+            expected.append((model.tick, ID, np.sum(model.households.wealth[rows]), np.sum(model.households.num_shocked[rows]),
+                             np.sum(model.households.someone_migrated[rows])))
+    model.data_collect = collect
+    moved = [0]
+    move_agents = model.move_agents
+    def move(moving, destinations):
+        moved[0] += len(moving)
+        move_agents(moving, destinations)
+    model.move_agents = move
+    model.run(12)
+    totals = model.upazila_totals()
+    assert len(totals) == len(expected) == 12 * len(model.df_hh)
+    tick, upazila, wealth, shocked, sent = map(np.array, zip(*expected))
+    assert np.array_equal(totals.tick, tick) and np.array_equal(totals.upazila, upazila)
+    assert np.allclose(totals.wealth, wealth)
+    assert np.array_equal(totals.shocked, shocked) and shocked.sum() > 0
+    assert np.array_equal(totals.sent, sent)
+    #every migrant that moved arrived somewhere
+    assert totals.arrivals[totals.tick == 11].sum() == moved[0] > 0
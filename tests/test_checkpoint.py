@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of seeding, checkpoints and the population cache, run with
+    python -m pytest tests
+"""
+
+#import packages
+import numpy as np
+import pandas as pd
+import pytest
+from benchmark import fake_census
+from ABM_model_steps import ABM_Model
+
+def outputs(model):
+    #everything a run saves, as flat tables
+    households, members = model.recorder.to_tables(['tick', 'upazila', 'hh_id'])
+    return households, members, model.mig_df.reset_index(drop=True), model.upazila_totals()
+
+def assert_same_run(a, b):
+    for x, y in zip(outputs(a), outputs(b)):
+        pd.testing.assert_frame_equal(x, y)
+
+@pytest.mark.parametrize('settings', [{'decision': 'tpb', 'network_type': 'random'},
+                                      {'decision': 'hybrid', 'network_type': 'small_world', 'parallel': 2},
+                                      {'decision': 'utility', 'network_type': 'fully_connected'}],
+                         ids=['tpb', 'hybrid_parallel', 'utility'])
+def test_restore_carries_on(make_model, tmp_path, settings):
+    #a run restored from its checkpoint at tick 12 ends the same as the run that was not stopped
+    full = make_model(ticks=24, seed=5, **settings)
+    full.run(24)
+    first = make_model(ticks=24, seed=5, **settings)
+    first.run(12, checkpoint_every=12, checkpoint_dir=str(tmp_path))
+    restored = ABM_Model.restore(str(tmp_path / 'tick_0012.npz'), census=fake_census(6, 20000),
+                                 hazards=(first.F, first.C, first.H), gdf='not used')
+    assert restored.tick == 12
+    restored.run(24)
+    assert_same_run(full, restored)
+
+def test_same_seed_same_run(make_model):
+    runs = [make_model(seed=seed) for seed in (3, 3, 4)]
+    for model in runs:
+        model.run(12)
+    assert_same_run(runs[0], runs[1])
+    assert not outputs(runs[0])[0].wealth.equals(outputs(runs[2])[0].wealth)
+
+def test_population_cache(make_model, tmp_path, monkeypatch):
+    #the population made for a seed is saved once and read back by later models, which run as if it was made
+    fresh = make_model(seed=7)
+    first = make_model(seed=7, population_cache=str(tmp_path))
+    assert len(list(tmp_path.iterdir())) == 1
+    def not_made(self, ID):
+        raise AssertionError('population should come from the cache')
+    monkeypatch.setattr(ABM_Model, 'set_up_agents', not_made)
+    cached = make_model(seed=7, population_cache=str(tmp_path))
+    for model in (fresh, first, cached):
+        model.run(12)
+    assert_same_run(fresh, first)
+    assert_same_run(fresh, cached)
+    #another seed is a different population
+    monkeypatch.undo()
+    make_model(seed=8, population_cache=str(tmp_path))
+    assert len(list(tmp_path.iterdir())) == 2
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of where migrants go, run with
+    python -m pytest tests
+"""
+
+#import packages
+import numpy as np
+import geopandas as gpd
+import pytest
+import shapely
+from destinations import *
+from decisions import send_migrants
+
+def fake_gdf(codes, seed=0):
+    #square upazilas over Bangladesh, in degrees as the shapefile is
+    rng = np.random.default_rng(seed)
+    lon = rng.uniform(88, 92.4, len(codes))
+    lat = rng.uniform(20.5, 26.2, len(codes))
+    return gpd.GeoDataFrame({'CC_3': [str(code) for code in codes]}, geometry=shapely.box(lon, lat, lon + 0.3, lat + 0.3), crs='EPSG:4326')
+
+def fake_pull(n, seed=0, **kwargs):
+    rng = np.random.default_rng(seed)
+    pull = pull_table(n, **kwargs)
+    for i in range(n):
+        pull.set_wtp(i, rng.uniform(0, 100, 5))
+        pull.set_jobs(i, rng.integers(0, 3))
+    return pull
+
+def test_not_own_neighbour():
+    rng = np.random.default_rng(0)
+    lon, lat = rng.uniform(88, 92.4, 30), rng.uniform(20.5, 26.2, 30)
+    for radius in [0, 80, np.inf]:
+        indptr, indices, distances = radius_neighbours(lon, lat, radius, block=7)
+        for i in range(30):
+            near = indices[indptr[i]:indptr[i + 1]]
+            assert len(near) >= 1 and i not in near
+            assert np.all(np.isfinite(distances[indptr[i]:indptr[i + 1]]))
+        if radius == np.inf:
+            assert np.all(np.diff(indptr) == 29)
+
+@pytest.mark.parametrize('method', DESTINATION_METHODS)
+@pytest.mark.parametrize('decay', DISTANCE_DECAYS + ('everywhere',))
+def test_never_chooses_origin(method, decay):
+    rng = np.random.default_rng(1)
+    n = 12
+    lon, lat = rng.uniform(88, 92.4, n), rng.uniform(20.5, 26.2, n)
+    neighbours = None if decay == 'everywhere' else radius_neighbours(lon, lat, np.inf)
+    pull = fake_pull(n, method=method, k=3, neighbours=neighbours, decay=None if decay == 'everywhere' else decay)
+    for origin in range(n):
+        for reach in [None, 0, 100]:
+            for _ in range(20):
+                assert pull.choose(origin, rng, reach) != origin
+
+def test_nothing_in_reach_goes_to_nearest():
+    lon, lat = np.array([90, 90.5, 91.5]), np.array([23, 23, 23])
+    pull = fake_pull(3, neighbours=radius_neighbours(lon, lat, 500))
+    #the pull of the last upazila is the highest but it is out of reach
+    for i, wtp in enumerate([10, 1, 100]):
+        pull.set_wtp(i, [wtp])
+        pull.set_jobs(i, 1)
+    assert pull.choose(0, None, 0) == 1
+    assert pull.choose(0, None, 200) == 2
+
+def test_nowhere_to_go():
+    assert fake_pull(1).choose(0) is None
+    assert fake_pull(1, method='weighted', neighbours=radius_neighbours(np.array([90.]), np.array([23.]), np.inf)).choose(0) is None
+
+def test_centroids_in_degrees():
+    codes = [100000, 100010, 100020]
+    gdf = fake_gdf(codes)
+    lon, lat = centroids(gdf, codes)
+    bounds = gdf.geometry.bounds
+    assert np.allclose(lon, (bounds.minx + bounds.maxx) / 2, atol=1e-3)
+    assert np.allclose(lat, (bounds.miny + bounds.maxy) / 2, atol=1e-3)
+
+@pytest.mark.parametrize('settings', [{'distance_decay': 'exponential', 'destination': 'top_k', 'top_k': 2},
+                                      {'search_radius': 150, 'destination': 'weighted'}])
+def test_migrants_leave_their_upazila(make_model, settings):
+    model = make_model(gdf=fake_gdf(100000 + 10 * np.arange(6)), **settings)
+    choices = []
+    choose = model.pull.choose
+    def recorded(origin, rng=None, reach=None):
+        choices.append((origin, choose(origin, rng, reach)))
+        return choices[-1][1]
+    model.pull.choose = recorded
+    model.run(12)
+    assert len(choices) > 0
+    assert all(origin != destination for origin, destination in choices)
+
+def test_reach_from_wealth_before_paying(make_model):
+    #a household with exactly mig_threshold can afford the whole radius, even though it has nothing left once it has paid
+    model = make_model(gdf=fake_gdf(100000 + 10 * np.arange(6)), search_radius=150)
+    model.run(2)
+    ID = model.df_hh.index[0]
+    people, households = model.people, model.households
+    row = model.registry.hh_set(ID)[0]
+    migrant = households.residents(row, people)[:1]
+    people.migrated[migrant] = False
+    households.wealth[row] = model.mig_threshold
+    send_migrants(model.decision, households, people, np.array([row]), np.array([True]), migrant, model.mig_util, model.mig_threshold)
+    assert households.wealth[row] == 0
+    reaches = []
+    model.pull.choose = lambda origin, rng=None, reach=None: reaches.append(reach)
+    model.pull_calculation(ID, migrant[0])
+    assert reaches == [150]
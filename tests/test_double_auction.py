@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the labour market, run with
+    python -m pytest tests
+
+double_auction hires everyone a round of the auction can at once, so
+ it does not draw the same random numbers as the auction the model
+ first ran, one household and one draw at a time. reference_auction
+ below is that auction on the columns of the stores; both are run from
+ the same labour market with many seeds and should hire as many people
+ for the same salaries on average.
+"""
+
+#import packages
+import copy
+import random
+import numpy as np
+from agent_store import EMPLOYMENT_CODE
+from rng import rng_service
+
+SEEDS = 150
+
+def reference_auction(model, ID, rng, py_rng):
+    #double_auction as it was, with np.random and random replaced by the generators rng and py_rng
+    people, households = model.people, model.households
+    looking = EMPLOYMENT_CODE['Looking']
+    origin_comm = model.__dict__[f'origin_comm_{ID}']
+    auctions = 3 # rounds w/ nothing changing
+    static_rounds = 0
+
+    ind_rows = model.registry.individuals(ID)
+    poss_employees = [i for i in ind_rows if people.employment[i] == looking]
+    poss_employers = [h for h in model.registry.hh_set(ID) if households.num_employees[h] > 0]
+    all_looking = len(poss_employees)
+
+    while static_rounds < auctions and all_looking > 0:
+        changed = False
+        for a in poss_employers: #households pick some people
+            if households.num_employees[a] > 0:
+                if households.num_employees[a] > len(poss_employees):
+                    random_inds_look = rng.choice(poss_employees, len(poss_employees))
+                else:
+                    random_inds_look = rng.choice(poss_employees, households.num_employees[a])
+                for random_ind in random_inds_look:
+                    if people.employment[random_ind] != looking:
+                        pass
+                    elif households.wtp[a] >= people.wta[random_ind]:
+                        households.employees[a] += 1
+                        households.num_employees[a] -= 1
+                        people.salary[random_ind] = (people.wta[random_ind] + households.wtp[a])/2
+                        people.employment[random_ind] = EMPLOYMENT_CODE['OtherAg']
+                        changed = True
+                        people.employer[random_ind] = a
+                        households.payments[a] += people.salary[random_ind]
+                        all_looking = all_looking - 1
+                        model.__dict__[f'got_job_{ID}'] += 1
+        if changed:
+            static_rounds = 0
+        else:
+            static_rounds += 1
+
+    #individuals may look for an unskilled or a skilled job within the community
+    still_looking_skilled = []
+    still_looking_unskilled = []
+    for i in ind_rows:
+        if people.employment[i] == looking:
+            if households.wealth[people.hh[i]] > model.wealth_factor:
+                still_looking_skilled.append(i)
+            else:
+                still_looking_unskilled.append(i)
+
+    if len(still_looking_unskilled) > origin_comm.avail_jobs / 2:
+        found_other_job_unskilled = py_rng.sample(still_looking_unskilled, round(origin_comm.avail_jobs / 2))
+    else:
+        found_other_job_unskilled = still_looking_unskilled
+    if len(still_looking_skilled) > origin_comm.avail_jobs / 2:
+        found_other_job_skilled = py_rng.sample(still_looking_skilled, round(origin_comm.avail_jobs / 2))
+    else:
+        found_other_job_skilled = still_looking_skilled
+
+    for i in found_other_job_unskilled:
+        people.employment[i] = EMPLOYMENT_CODE['OtherNonAg_Unskilled']
+        people.salary[i] = 24000 * py_rng.random() #some small number
+    for i in found_other_job_skilled:
+        people.employment[i] = EMPLOYMENT_CODE['OtherNonAg_Skilled']
+        people.salary[i] = 50000 * py_rng.random() #some greater number
+
+def labour_market(model):
+    #model and the upazila stopped just before its first auction with both people looking and households hiring,
+    #with copies of the columns of both stores then
+    looking = EMPLOYMENT_CODE['Looking']
+    saved = []
+    double_auction = model.double_auction
+    def save(ID):
+        ind_rows, hh_rows = model.registry.individuals(ID), model.registry.hh_set(ID)
+        if not saved and np.any(model.people.employment[ind_rows] == looking) and np.sum(model.households.num_employees[hh_rows]) > 10:
+            saved.append((ID, copy.deepcopy(model.people.data), copy.deepcopy(model.households.data), model.__dict__[f'origin_comm_{ID}'].avail_jobs))
+        double_auction(ID)
+    model.double_auction = save
+    while not saved:
+        model.model_step()
+        model.data_collect()
+        model.tick_up()
+    ID, people, households, avail_jobs = saved[0]
+    model.people.data, model.households.data = people, households
+    model.__dict__[f'origin_comm_{ID}'].avail_jobs = avail_jobs
+    return ID
+
+def outcomes(model, ID, auction, seeds):
+    #hires and the salaries of each kind of job after running auction from the same labour market with every seed
+    start = {name: column.copy() for name, column in model.people.data.items()}, \
+            {name: column.copy() for name, column in model.households.data.items()}
+    ind_rows = model.registry.individuals(ID).copy()
+    hires, salaries = [], {job: [] for job in ['OtherAg', 'OtherNonAg_Unskilled', 'OtherNonAg_Skilled']}
+    for seed in seeds:
+        model.people.data = {name: column.copy() for name, column in start[0].items()}
+        model.households.data = {name: column.copy() for name, column in start[1].items()}
+        model.__dict__[f'got_job_{ID}'] = 0
+        auction(seed)
+        hires.append(model.__dict__[f'got_job_{ID}'])
+        for job in salaries:
+            salaries[job].append(model.people.salary[ind_rows[model.people.employment[ind_rows] == EMPLOYMENT_CODE[job]]])
+    model.people.data, model.households.data = start
+    return np.array(hires), {job: np.concatenate(values) for job, values in salaries.items()}
+
+def test_same_as_reference(make_model):
+    model = make_model(decision='utility', population=100000)
+    ID = labour_market(model)
+
+    def vectorised(seed):
+        model.rng = rng_service(seed)
+        model.double_auction(ID)
+    def reference(seed):
+        reference_auction(model, ID, np.random.default_rng(seed), random.Random(seed))
+
+    hires, salaries = outcomes(model, ID, vectorised, range(SEEDS))
+    ref_hires, ref_salaries = outcomes(model, ID, reference, range(SEEDS))
+    assert ref_hires.mean() > 0
+    #means within four standard errors of the reference, deciles within 5% of the highest salary
+    assert abs(hires.mean() - ref_hires.mean()) < 4 * np.sqrt((hires.var() + ref_hires.var()) / SEEDS) + 1e-9
+    for job, reference_salaries in ref_salaries.items():
+        assert abs(len(salaries[job]) - len(reference_salaries)) <= 0.05 * len(reference_salaries)
+        if len(reference_salaries):
+            error = np.sqrt(salaries[job].var() / len(salaries[job]) + reference_salaries.var() / len(reference_salaries))
+            assert abs(salaries[job].mean() - reference_salaries.mean()) < 4 * error
+            deciles = np.linspace(0.1, 0.9, 9)
+            assert np.allclose(np.quantile(salaries[job], deciles), np.quantile(reference_salaries, deciles),
+                               rtol=0, atol=0.05 * reference_salaries.max())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the CSR household networks, run with
+    python -m pytest tests
+"""
+
+#import packages
+import numpy as np
+import pytest
+from network import *
+
+def dense(indptr, indices):
+    #adjacency matrix of a CSR network
+    n = len(indptr) - 1
+    if indices is None:
+        return np.ones((n, n), dtype=np.int64) - np.eye(n, dtype=np.int64)
+    adjacency = np.zeros((n, n), dtype=np.int64)
+    np.add.at(adjacency, (np.repeat(np.arange(n), np.diff(indptr)), indices), 1)
+    return adjacency
+
+def check_simple(indptr, indices):
+    #undirected, with no loops and no double edges
+    adjacency = dense(indptr, indices)
+    assert indptr[0] == 0 and np.all(np.diff(indptr) >= 0)
+    assert np.array_equal(adjacency, adjacency.T)
+    assert np.all(np.diag(adjacency) == 0)
+    assert adjacency.max(initial=0) <= 1
+    return adjacency
+
+@pytest.mark.parametrize('make', [lambda rng: gnp_csr(300, 0.1, rng), lambda rng: watts_strogatz_csr(300, 10, 0.15, rng),
+                                  lambda rng: barabasi_albert_csr(300, 10, rng), lambda rng: complete_csr(300),
+                                  lambda rng: empty_csr(300)],
+                         ids=['random', 'small_world', 'preferential', 'fully_connected', 'none'])
+def test_simple_networks(make):
+    check_simple(*make(np.random.default_rng(0)))
+
+def test_random_edges():
+    #every possible edge is there with probability p
+    n, p = 400, 0.1
+    edges = [dense(*gnp_csr(n, p, np.random.default_rng(seed))).sum() // 2 for seed in range(20)]
+    possible = n * (n - 1) / 2
+    assert abs(np.mean(edges) - p * possible) < 4 * np.sqrt(possible * p * (1 - p) / len(edges))
+    assert gnp_csr(n, 0, np.random.default_rng(0))[1].size == 0
+    assert gnp_csr(n, 1, np.random.default_rng(0))[1] is None
+
+def test_small_world_lattice():
+    #with nothing rewired it is a ring with each node joined to its k // 2 nearest on either side
+    n, k = 50, 6
+    adjacency = check_simple(*watts_strogatz_csr(n, k, 0, np.random.default_rng(0)))
+    distance = np.abs(np.subtract.outer(np.arange(n), np.arange(n)))
+    assert np.array_equal(adjacency, ((np.minimum(distance, n - distance) <= k // 2) & (distance > 0)).astype(np.int64))
+
+def test_preferential_degrees():
+    n, m = 300, 4
+    adjacency = check_simple(*barabasi_albert_csr(n, m, np.random.default_rng(0)))
+    assert adjacency.sum() // 2 == m + (n - m - 1) * m
+    assert adjacency.sum(axis=1).min() >= 1 and adjacency[m + 1:].sum(axis=1).min() >= m
+
+@pytest.mark.parametrize('network', [gnp_csr(60, 0.2, np.random.default_rng(1)), complete_csr(60), empty_csr(60)],
+                         ids=['random', 'fully_connected', 'none'])
+def test_neighbour_sum(network):
+    values = np.random.default_rng(2).random(60)
+    adjacency = dense(*network)
+    assert np.allclose(neighbour_sum(*network, values), adjacency @ values)
+    for node in (0, 17, 59):
+        assert np.array_equal(np.sort(neighbours(*network, node)), np.flatnonzero(adjacency[node]))
+
+@pytest.mark.parametrize('network_type', ['random', 'small_world', 'preferential', 'fully_connected', 'none'])
+def test_model_networks(make_model, network_type):
+    #each upazila has a network over all its households, which every household sees
+    model = make_model(network_type=network_type, n_upazilas=3)
+    for ID in model.df_hh.index:
+        indptr, indices = model.__dict__[f'network_{ID}']
+        assert len(indptr) == model.df_hh.loc[ID] + 1
+        assert (indices is None) == (network_type == 'fully_connected')
+        assert (indptr[-1] == 0) == (network_type == 'none')
+        check_simple(indptr, indices)
+        for row in model.registry.hh_set(ID):
+            assert model.households.objects[row].network[0] is indptr
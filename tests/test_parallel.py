@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of stepping upazilas in parallel, run with
+    python -m pytest tests
+"""
+
+#import packages
+import threading
+import numpy as np
+import ABM_model_steps
+
+def test_same_as_serial(make_model):
+    #with migrants moving at the end of the tick, threads give the same run as stepping one upazila at a time
+    runs = []
+    for parallel in [None, 1, 3]:
+        model = make_model(parallel=parallel, moves_visible='next_tick')
+        model.run(12)
+        runs.append((model.people.currently_living[:len(model.people)], model.households.wealth[:len(model.households)],
+                     model.mig_df.total_mirgrants.values))
+    for run in runs[1:]:
+        assert all(np.array_equal(a, b) for a, b in zip(runs[0], run))
+
+def test_threads_stop_after_run(make_model):
+    before = threading.active_count()
+    model = make_model(parallel=3)
+    model.run(3)
+    assert model.pool is None
+    assert threading.active_count() == before
+
+def test_timings_of_every_upazila(make_model, monkeypatch):
+    #a clock that moves on by one second each time a thread reads it, so every lap of every upazila adds
+    #exactly one second to its phase, however the threads run
+    clock = threading.local()
+    def perf_counter():
+        clock.now = getattr(clock, 'now', 0) + 1
+        return clock.now
+    model = make_model(parallel=3)
+    model.timings = {}
+    monkeypatch.setattr(ABM_model_steps.time, 'perf_counter', perf_counter)
+    model.run(3)
+    monkeypatch.undo()
+    for phase in ['schedule', 'shock', 'check_land', 'find_work', 'double_auction']:
+        assert model.timings[phase] == 3 * len(model.df_hh)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the registry of where every agent is, run with
+    python -m pytest tests
+"""
+
+#import packages
+import numpy as np
+
+def test_gaps_keep_order(make_model):
+    #individuals moving away leave gaps that are closed when the rows are read, keeping the order of the rest
+    model = make_model(n_upazilas=3)
+    registry, people = model.registry, model.people
+    A, B, C = (int(ID) for ID in model.df_hh.index)
+    before = {ID: registry.individuals(ID).copy() for ID in (A, B, C)}
+
+    leaving = before[A][[1, 5, 6, 20]]
+    to_B = registry.household(B, 1)
+    registry.move(leaving, B, to_B)
+    #one of them moves on before the rows of B are read again, with one more from A
+    to_C = registry.household(C, 2)
+    registry.move([leaving[2], before[A][0]], C, to_C)
+
+    assert np.array_equal(registry.individuals(A), np.setdiff1d(before[A], [*leaving, before[A][0]], assume_unique=True))
+    assert np.array_equal(registry.individuals(B), np.concatenate([before[B], leaving[[0, 1, 3]]]))
+    assert np.array_equal(registry.individuals(C), np.concatenate([before[C], [leaving[2], before[A][0]]]))
+    assert sum(len(registry.individuals(ID)) for ID in (A, B, C)) == len(people)
+    #reading again without anyone moving gives the same rows
+    assert np.array_equal(registry.individuals(A), np.setdiff1d(before[A], [*leaving, before[A][0]], assume_unique=True))
+
+    #each individual is found where it lives now and where it comes from
+    for row, ID, hh_row in [(leaving[0], B, to_B), (leaving[2], C, to_C), (before[A][2], A, people.hh[before[A][2]])]:
+        now, origin = registry.locate(people.id[row])
+        assert now == (ID, hh_row, row)
+        assert origin == (A, people.origin_hh[row])
+    #places point back into the rows of each upazila
+    for ID in (A, B, C):
+        rows = registry.individuals(ID)
+        assert np.array_equal(registry.place[rows], np.arange(len(rows)))
+
+def test_households_in_id_order(make_model):
+    model = make_model(n_upazilas=3)
+    for ID in model.df_hh.index:
+        rows = model.registry.hh_set(ID)
+        assert len(rows) == model.df_hh.loc[ID]
+        assert np.array_equal(model.households.hh_id[rows], np.arange(1, len(rows) + 1))
+        assert all(model.registry.household(ID, hh_id) == rows[hh_id - 1] for hh_id in (1, len(rows)))
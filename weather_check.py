@@ -12,54 +12,103 @@ from matplotlib.colors import Normalize
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
 import pandas as pd
-from shapely.geometry import Polygon, MultiPolygon
-from shapely.ops import nearest_points
+import shapely
+from shapely.strtree import STRtree
+import hashlib
+import json
+import os
+import glob
+import shutil
+
+def input_files(senario):
+    #paths of all the files the weather checks read for a senario
+    senario=str(senario)
+    return {'hist_ts':r"CMIP6 data\Hist\downscalled_CMIP6_hist_ts.nc",
+            'hist_wind':r"CMIP6 data\Hist\downscalled_CMIP6_wind_hist.nc",
+            'hist_pr':r"CMIP6 data\Hist\downscalled_CMIP6_hist_pr_divided_by_4.nc",
+            'hist_ocean_ts':r"CMIP6 data\Hist/ts_Amon_MRI-ESM2-0_historical_r1i1p1f1_gn_185001-201412.nc",
+            'pr':r"CMIP6 data\SSPs/"+senario+'/downscalled_CMIP6_SSP'+senario+'_pr_divided_by_4.nc',
+            'ts':r"MIP6 data\SSPs/"+senario+'/downscalled_CMIP6_SSP'+senario+'_ts.nc',
+            'wind':r"CMIP6 data\SSPs/"+senario+'/downscalled_CMIP6_SSP'+senario+'_wind.nc',
+            'ocean_ts':r"CMIP6 data\SSPs/"+senario+'/ts_Amon_MRI-ESM2-0_ssp'+senario+'_r1i1p1f1_gn_201501-210012.nc',
+            'upazilas':r"shapefiles\gadm41_BGD_3.shp",
+            'rivers':r"shapefiles\bgd_watcrsa_1m_iscgm.shp"}
 
 class check_weather:
-    def __init__(self,senario):    
+    def __init__(self,senario,cache_dir=None,lazy=False,chunks={'time':120},end_date=None,crop=False,margin=0.5):    
+        files=input_files(senario)
+        self.cache_dir=cache_dir #where precomputed tables are kept, None to always recompute
         
+        #reading in upazila shapefile
+        bgd_shapefile_path = files['upazilas']
+        self.gdf = gpd.read_file(bgd_shapefile_path)
+        self.gdf=self.gdf.drop(209)
+        self.gdf=self.gdf.sort_values(by='CC_3')
+
+        #in lazy mode the CMIP6 data is opened chunked along time with dask, so the hazards are computed out-of-core
+        self.lazy=lazy
+        #crop keeps only the upazilas' bounding box (plus a margin in degrees) of the gridded data,
+        #note the flood, wind and heat normalisation then only sees the cropped grid
+        self.cropped=crop
+        self.bounds=self.gdf.total_bounds+np.array([-margin,-margin,margin,margin])
+        chunks=chunks if lazy else None
+
         ##read in CMIP6 data
         #historical data
-        self.hist_data_ts=xr.open_dataset(r"CMIP6 data\Hist\downscalled_CMIP6_hist_ts.nc")
-        self.hist_data_wind=xr.open_dataset(r"CMIP6 data\Hist\downscalled_CMIP6_wind_hist.nc")
-        self.hist_data_pr=xr.open_dataset(r"CMIP6 data\Hist\downscalled_CMIP6_hist_pr_divided_by_4.nc")
-        self.ocean_temp_hist=xr.open_dataset(r"CMIP6 data\Hist/ts_Amon_MRI-ESM2-0_historical_r1i1p1f1_gn_185001-201412.nc",engine='netcdf4')
+        self.hist_data_ts=self.crop(xr.open_dataset(files['hist_ts'],chunks=chunks))
+        self.hist_data_wind=self.crop(xr.open_dataset(files['hist_wind'],chunks=chunks))
+        self.hist_data_pr=self.crop(xr.open_dataset(files['hist_pr'],chunks=chunks))
+        self.ocean_temp_hist=xr.open_dataset(files['hist_ocean_ts'],engine='netcdf4',chunks=chunks)
 
         #senario data
         self.senario=str(senario)
-        self.pr=xr.open_dataset(r"CMIP6 data\SSPs/"+self.senario+'/downscalled_CMIP6_SSP'+self.senario+'_pr_divided_by_4.nc')
-        self.ts=xr.open_dataset(r"MIP6 data\SSPs/"+self.senario+'/downscalled_CMIP6_SSP'+self.senario+'_ts.nc')
-        self.wind=xr.open_dataset(r"CMIP6 data\SSPs/"+self.senario+'/downscalled_CMIP6_SSP'+self.senario+'_wind.nc')
-        self.ocean_temp=xr.open_dataset(r"CMIP6 data\SSPs/"+self.senario+'/ts_Amon_MRI-ESM2-0_ssp'+self.senario+'_r1i1p1f1_gn_201501-210012.nc',engine='netcdf4')
+        self.pr=self.crop(xr.open_dataset(files['pr'],chunks=chunks))
+        self.ts=self.crop(xr.open_dataset(files['ts'],chunks=chunks))
+        self.wind=self.crop(xr.open_dataset(files['wind'],chunks=chunks))
+        self.ocean_temp=xr.open_dataset(files['ocean_ts'],engine='netcdf4',chunks=chunks)
         
         
         #patching together the historical and senario so that the simulations can start in 2011
-        end_date = self.ocean_temp_hist.time.max().values
-        start_date = end_date - np.timedelta64(4*365, 'D')
-        last_years = self.ocean_temp_hist.sel(time=slice(start_date, end_date))
+        end_date_hist = self.ocean_temp_hist.time.max().values
+        start_date = end_date_hist - np.timedelta64(4*365, 'D')
+        last_years = self.ocean_temp_hist.sel(time=slice(start_date, end_date_hist))
         self.ocean_temp = xr.concat([last_years, self.ocean_temp], dim='time')
         self.ocean_temp=self.ocean_temp.sel(lat=slice(*[10, 15]), lon=slice(*[80, 93.5]))
 
-        end_date = self.hist_data_ts.time.max().values
-        start_date = end_date - np.timedelta64(4*365, 'D')
-        last_years = self.hist_data_ts.sel(time=slice(start_date, end_date))
+        end_date_hist = self.hist_data_ts.time.max().values
+        start_date = end_date_hist - np.timedelta64(4*365, 'D')
+        last_years = self.hist_data_ts.sel(time=slice(start_date, end_date_hist))
         self.ts = xr.concat([last_years, self.ts], dim='time')
 
-        last_years = self.hist_data_wind.sel(time=slice(start_date, end_date))
+        last_years = self.hist_data_wind.sel(time=slice(start_date, end_date_hist))
         self.wind = xr.concat([last_years, self.wind], dim='time')
 
-        last_years = self.hist_data_pr.sel(time=slice(start_date, end_date))
+        last_years = self.hist_data_pr.sel(time=slice(start_date, end_date_hist))
         self.pr = xr.concat([last_years, self.pr], dim='time')
+
+        #only keep the time window being simulated
+        if end_date is not None:
+            self.ocean_temp=self.ocean_temp.sel(time=slice(None,end_date))
+            self.ts=self.ts.sel(time=slice(None,end_date))
+            self.wind=self.wind.sel(time=slice(None,end_date))
+            self.pr=self.pr.sel(time=slice(None,end_date))
         
         #getting coordinate data
         self.lat = self.pr.lat
         self.lon = self.pr.lon
-        
-        #reading in upazila shapefile
-        bgd_shapefile_path = r"shapefiles\gadm41_BGD_3.shp"
-        self.gdf = gpd.read_file(bgd_shapefile_path)
-        self.gdf=self.gdf.drop(209)
-        self.gdf=self.gdf.sort_values(by='CC_3')
+
+        #central coordinates of each upazila, and the grid cells nearest to them for each grid seen
+        self.centroids=self.gdf.geometry.centroid
+        self.grid_index={}
+
+    def crop(self,data):
+        #keep only the grid cells inside the bounding box of the upazilas
+        if not self.cropped:
+            return data
+        lon_min,lat_min,lon_max,lat_max=self.bounds
+        lat=slice(lat_min,lat_max) if data.lat[0]<=data.lat[-1] else slice(lat_max,lat_min)
+        lon=slice(lon_min,lon_max) if data.lon[0]<=data.lon[-1] else slice(lon_max,lon_min)
+        return data.sel(lat=lat,lon=lon)
         
     def binary_checker(self):
         #an early weather checking function, gives 0 if there is no weather event and 1 if there is
@@ -123,37 +172,22 @@ class check_weather:
     def flood_index(self):
         #a flood risk index based on the calculations of Deo et al., 2018
 
-        #lists to hold effective percipitation values
-        P_E=[]
-        max_P_E=[]
+        #weights of the monthly version of the equation from Deo et al., 2018, current month first
+        weights=np.array([1,0.39,0.28,0.22,0.17,0.14,0.11,0.09,0.07,0.05,0.03,0.02])
 
-        #getting time values
-        index_time=self.pr.time
-        years = np.unique(self.pr['time.year'])
+        #calculating effective percipitation as a convolution of the weights along time
+        #rolling windows run from the oldest month to the current one, so the weights are reversed
+        pr_window=self.pr.pr.rolling(time=len(weights)).construct('window')
+        P_E=24*pr_window.dot(xr.DataArray(weights[::-1],dims='window'))
+        #there is no full year before the first 12 months, so assign 0's
+        first_year=xr.DataArray(np.arange(self.pr.sizes['time'])<12,coords={'time':self.pr.time},dims='time')
+        P_E=xr.where(first_year,self.pr.pr*0,P_E).transpose('time','lat','lon')
+        P_E_dataset = xr.Dataset({'P_E': P_E})
 
-        #calculating effective percipitation
-        for k in range(12): #for first year where we cannot calculate the index
-            P_E.append(self.pr.pr[k]*0) #assign 0's for the year
-        for i in range(12,len(index_time)):
-            #monthly version of equation from Deo et al., 2018
-            P_E.append(24*(self.pr.pr[i]+0.39*self.pr.pr[i-1]+0.28*self.pr.pr[i-2]+0.22*self.pr.pr[i-3]+0.17*self.pr.pr[i-4]+0.14*self.pr.pr[i-5]+0.11*self.pr.pr[i-6]+0.09*self.pr.pr[i-7]+0.07*self.pr.pr[i-8]+0.05*self.pr.pr[i-9]+0.03*self.pr.pr[i-10]+0.02*self.pr.pr[i-11]))
-            
-        #Create an xarray dataset for P_E
-        P_E_data = np.array(P_E)
-        P_E_xr = xr.DataArray(P_E_data, coords=[index_time, self.lat, self.lon], dims=['time', 'lat', 'lon'])
-        P_E_dataset = xr.Dataset({'P_E': P_E_xr})
-        
-        #find the maximum effective percipitation from the time period
-        for year in years:
-            for lat_val in self.lat:
-                for lon_val in self.lon:
-                    P_E_yearly_grid = P_E_dataset.sel(time=str(year), lat=lat_val, lon=lon_val)
-                    max_P_E.append(P_E_yearly_grid) 
-        
-        max_P_E_array = xr.concat(max_P_E, dim='year')  # Concatenate along 'year' dimension
-        mean_max_P_E = max_P_E_array.mean(dim='year')  # Calculate mean over years
-        
-        std_max_P_E = max_P_E_array.std(dim='year')  # Calculate standard deviation over years
+        #the yearly grids stacked along 'year' only overlap at their own time steps, so the
+        #statistics over years are the mean and standard deviation over the grid at each time
+        mean_max_P_E = P_E_dataset.mean(dim=['lat','lon'])
+        std_max_P_E = P_E_dataset.std(dim=['lat','lon'])
         
         #calculate the flood index
         I_flood = (P_E_dataset - mean_max_P_E) / std_max_P_E
@@ -168,7 +202,7 @@ class check_weather:
         
         #masking datat to only keep what is above the cyclone threshold
         cyclone_mask = (
-            (self.wind.wind_speed.isel(plev=0).values > wind_threshold).any() &
+            (self.wind.wind_speed.isel(plev=0) > wind_threshold).any() &
             (self.ocean_temp.ts.mean(dim=['lat','lon']) > temp_threshold)
         )
         cyclone_wind = xr.where(cyclone_mask.astype("float64"), self.wind.isel(plev=0).astype("float64"), 0)
@@ -179,80 +213,87 @@ class check_weather:
         #finding times of heatwaves based on the definition by Nissan et al., 2017
 
         #find the 95th percentile temperature from the historical data
-        p95=self.hist_data_ts.quantile(0.95)
+        #(the quantile needs the whole record in one chunk when it is loaded lazily)
+        p95=self.hist_data_ts.chunk({'time':-1}).quantile(0.95) if self.lazy else self.hist_data_ts.quantile(0.95)
         
-        #filter to keep values >= 95th percentile
-        heatwave = self.ts.where(self.ts >= p95, drop=True)
+        #filter to keep values >= 95th percentile, dropping the times and grid cells without any
+        #(the same as where(drop=True), but the mask is only computed once reduced along each dim)
+        is_heatwave = self.ts >= p95
+        keep = {dim: is_heatwave.ts.any(dim=[d for d in is_heatwave.ts.dims if d != dim]).values for dim in is_heatwave.ts.dims}
+        heatwave = self.ts.where(is_heatwave).isel(keep)
 
         return heatwave
     
+    def river_distances(self):
+        #1 for upazilas with rivers or lakes in them, otherwise 1 minus the distance from the
+        #closest centroid of the upazila's polygons to the nearest waterbody
+        #the table only depends on the shapefiles, so it is saved by CC_3 code and reused
+        files=input_files(self.senario)
+        table_path=None
+        if self.cache_dir is not None:
+            key=hashlib.sha256((file_digest(files['upazilas'])+file_digest(files['rivers'])).encode()).hexdigest()[:16]
+            table_path=os.path.join(self.cache_dir,'river_dist_'+key+'.csv')
+            if os.path.exists(table_path):
+                table=pd.read_csv(table_path,index_col='CC_3')
+                return table.loc[self.gdf['CC_3'].astype(int),'river_dist'].values
+
+        #load in rivers and lakes shapefile and build a spatial index over it once
+        gdf_river = gpd.read_file(files['rivers'])
+        tree=STRtree(gdf_river.geometry.values)
+        geometries=self.gdf.geometry.values
+
+        #check which upazilas any river intersects with
+        hits=tree.query(geometries,predicate='intersects')
+        has_river=np.zeros(len(geometries),dtype=bool)
+        has_river[hits[0]]=True
+
+        #otherwise find the distance from each polygon centroid to the nearest waterbody
+        #(polygons and multipolygons both split into their parts here), keeping the smallest
+        parts,part_of=shapely.get_parts(geometries,return_index=True)
+        _,distances=tree.query_nearest(shapely.centroid(parts),return_distance=True,all_matches=False)
+        distance_to_nearest_river=np.full(len(geometries),np.inf)
+        np.minimum.at(distance_to_nearest_river,part_of,distances)
+
+        #take 1 minus that distance so that it can be used to scale the flood index values
+        river_dist=np.where(has_river,1,1-distance_to_nearest_river)
+
+        if table_path is not None:
+            os.makedirs(self.cache_dir,exist_ok=True)
+            pd.DataFrame({'CC_3':self.gdf['CC_3'].astype(int).values,'river_dist':river_dist}).to_csv(table_path,index=False)
+        return river_dist
+
     def region_assign(self,data,F=False):
         #function for assigning data to upazilas
 
-        #list for holding data
-        data_at_centroid = []
-        
         #finding distance to water bodies for flood index calculation
         if F:
-            #list for holding distances
-            river_dist=[]
-
-            #load in rivers and lakes shapefile
-            river_shapefile_path = r"shapefiles\bgd_watcrsa_1m_iscgm.shp"
-            gdf_river = gpd.read_file(river_shapefile_path)
-
-            for index, region in self.gdf.iterrows(): #run through each upazila
-                
-                #check if any river intersects with the current region
-                intersecting_rivers = gdf_river[gdf_river.intersects(region.geometry)]
-                if not intersecting_rivers.empty:
-                    #if there is rivers or lakes in the given upazila, append 1
-                    river_dist.append(1)
-
-                else:
-                    #otherwise, fins the distance to the nearest waterbody
-                    nearest_river_distances = []
-
-                    if isinstance(region.geometry, Polygon): #had two different types of polygons in the shapefile for some reason
-                        polygon = region.geometry
-                        nearest_river = nearest_points(polygon.centroid, gdf_river.unary_union)[1]
-                        distance_to_nearest_river = polygon.centroid.distance(nearest_river)
-                        nearest_river_distances.append(distance_to_nearest_river)
-                    if isinstance(region.geometry, MultiPolygon):
-                        for polygon in region.geometry.geoms:
-                            nearest_river = nearest_points(polygon.centroid, gdf_river.unary_union)[1]
-                            distance_to_nearest_river = polygon.centroid.distance(nearest_river)
-                            nearest_river_distances.append(distance_to_nearest_river)
-                    distance_to_nearest_river = min(nearest_river_distances)
-
-                    #take 1 minus that distance so that it can be used to scale the flood index values
-                    river_dist.append(1-distance_to_nearest_river)
-
             #add this distance factor to the upazila data
-            self.gdf['river_dist'] = river_dist
-
-        #loop through each upazila
-        for index, row in self.gdf.iterrows():
-            #find central coordinates of the upazila
-            centroid = row['geometry'].centroid
-            centroid_lat = centroid.y
-            centroid_lon = centroid.x
-            
-            #find the data at the central coorinate point
-            if F:
-                #if this is floods being calculated, include the river distance factor
-                data_at_centroid.append(data.sel(lat=centroid_lat, lon=centroid_lon, method='nearest')*row['river_dist'])
+            self.gdf['river_dist'] = self.river_distances()
 
-            else:
-                data_at_centroid.append(data.sel(lat=centroid_lat, lon=centroid_lon, method='nearest'))
-            
-        #create an xarray for the data
-        combined_data = xr.concat(data_at_centroid, dim='region')
+        #pick out the grid cell nearest each upazila's centroid, all upazilas in one selection
+        lat_index,lon_index=self.grid_points(data)
+        combined_data=data.isel(lat=xr.DataArray(lat_index,dims='region'),lon=xr.DataArray(lon_index,dims='region'))
+        combined_data=combined_data.transpose('region',...)
+
+        if F:
+            #if this is floods being calculated, include the river distance factor
+            river_dist=xr.DataArray(self.gdf['river_dist'].values,dims='region',name=getattr(combined_data,'name',None))
+            combined_data=combined_data*river_dist
 
         #let the upazila ID act as a coordinate for the data
-        combined_data = combined_data.assign_coords(region=self.gdf.loc[:,'CC_3'].astype(int))
+        combined_data = combined_data.assign_coords(region=self.gdf.loc[:,'CC_3'].astype(int).values)
     
         return combined_data
+
+    def grid_points(self,data):
+        #indices of the grid cells nearest to each upazila's central coordinates
+        #worked out once per grid and reused for every hazard on the same grid
+        key=(data.lat.values.tobytes(),data.lon.values.tobytes())
+        if key not in self.grid_index:
+            lat_index=data.indexes['lat'].get_indexer(self.centroids.y.values,method='nearest')
+            lon_index=data.indexes['lon'].get_indexer(self.centroids.x.values,method='nearest')
+            self.grid_index[key]=(lat_index,lon_index)
+        return self.grid_index[key]
     
     def plot_upazilas(self,t):
         #a function to plot the weather event data for quick checking
@@ -314,4 +355,85 @@ class check_weather:
             plt.colorbar(sm, ax=ax, orientation='vertical', fraction=0.05, pad=0.05)
             plt.subplots_adjust(right=0.85)
             
-            plt.show()
\ No newline at end of file
+            plt.show()
+
+def file_digest(path,known=None):
+    #sha256 of a file's contents, a shapefile includes its sidecar files (.dbf, .shx, ...)
+    #known maps path to [size, mtime, digest] so unchanged files are not read again
+    paths=sorted(glob.glob(os.path.splitext(path)[0]+'.*')) if path.endswith('.shp') else [path]
+    stamp=[[os.path.getsize(p),os.stat(p).st_mtime_ns] for p in paths]
+    if known is not None and path in known and known[path][0]==stamp:
+        return known[path][1]
+    sha=hashlib.sha256()
+    for p in paths:
+        with open(p,'rb') as f:
+            for block in iter(lambda: f.read(1<<20),b''):
+                sha.update(block)
+    digest=sha.hexdigest()
+    if known is not None:
+        known[path]=[stamp,digest]
+    return digest
+
+def hazard_key(senario,binary,cache_dir,options={}):
+    #key for the hazards of a senario, changes if any input file, the mode or this code changes
+    digest_path=os.path.join(cache_dir,'digests.json')
+    known={}
+    if os.path.exists(digest_path):
+        with open(digest_path) as f:
+            known=json.load(f)
+    key=hashlib.sha256()
+    for name,path in sorted(input_files(senario).items()):
+        key.update((name+':'+file_digest(path,known)).encode())
+    key.update(('senario:'+str(senario)+',binary:'+str(bool(binary))).encode())
+    for name,value in sorted(options.items()):
+        key.update((','+name+':'+str(value)).encode())
+    key.update(file_digest(os.path.abspath(__file__)).encode())
+    os.makedirs(cache_dir,exist_ok=True)
+    with open(digest_path+'.tmp','w') as f:
+        json.dump(known,f)
+    os.replace(digest_path+'.tmp',digest_path)
+    return key.hexdigest()[:16]
+
+def load_weather(senario,binary=False,cache_dir='weather_cache',**options):
+    #F, C and H per upazila for a senario, read from the cache when the inputs are unchanged
+    #options (lazy, chunks, end_date, crop, margin) are passed on to check_weather
+    if cache_dir is None:
+        weather=check_weather(senario,**options)
+        hazards=weather.binary_checker() if binary else weather.normalised_checker()
+        return tuple(data.load() for data in hazards)
+
+    path=os.path.join(cache_dir,'SSP'+str(senario)+('_binary_' if binary else '_normalised_')+hazard_key(senario,binary,cache_dir,options))
+    if os.path.exists(os.path.join(path,'meta.json')):
+        with open(os.path.join(path,'meta.json')) as f:
+            kinds=json.load(f)
+        hazards=[]
+        for name in ['F','C','H']:
+            opener=xr.open_dataarray if kinds[name]=='dataarray' else xr.open_dataset
+            with opener(os.path.join(path,name+'.nc')) as data:
+                hazards.append(data.load())
+        return tuple(hazards)
+
+    weather=check_weather(senario,cache_dir,**options)
+    hazards=weather.binary_checker() if binary else weather.normalised_checker()
+    hazards=tuple(data.load() for data in hazards)
+
+    #write to a temporary folder first so a half written cache is never read
+    tmp_path=path+'.tmp'+str(os.getpid())
+    os.makedirs(tmp_path,exist_ok=True)
+    kinds={}
+    for name,data in zip(['F','C','H'],hazards):
+        kinds[name]='dataarray' if isinstance(data,xr.DataArray) else 'dataset'
+        data.to_netcdf(os.path.join(tmp_path,name+'.nc'))
+    with open(os.path.join(tmp_path,'meta.json'),'w') as f:
+        json.dump(kinds,f)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path,path)
+    return hazards
+
+def hazard_table(data,name,time,regions):
+    #hazard as a dense (time, region) numpy array, NaN where the hazard has no value for a time
+    if isinstance(data,xr.Dataset):
+        data=data[name]
+    data=data.reindex(time=time,region=list(regions))
+    return np.asarray(data.transpose('time','region').values,dtype=np.float64)